@@ -9,7 +9,7 @@ def load_image(image_path):
     return img
 
 # Fonction pour créer une animation de rotation du logo
-def animate_logo(image_path, save_path='logo_animation.mp4'):
+def animate_logo(image_path, save_path='logo_animation.mp4', frames=360, fps=30, writer='ffmpeg', show=True):
     # Charger l'image du logo
     img = load_image(image_path)
 
@@ -32,11 +32,14 @@ def animate_logo(image_path, save_path='logo_animation.mp4'):
         return [logo]
 
     # Créer l'animation (rotation de 360°)
-    ani = animation.FuncAnimation(fig, update, frames=np.arange(0, 360, 1), blit=True, repeat=True)
+    ani = animation.FuncAnimation(fig, update, frames=np.linspace(0, 360, frames, endpoint=False), blit=True, repeat=True)
 
     # Sauvegarder l'animation sous forme de fichier vidéo
-    ani.save(save_path, writer='ffmpeg', fps=30)
-    plt.show()
+    ani.save(save_path, writer=writer, fps=fps)
+    if show:
+        plt.show()
+    plt.close(fig)
 
 # Exécuter l'animation avec le fichier logo PNG
-animate_logo('LOGO_CLN.png')
+if __name__ == '__main__':
+    animate_logo('LOGO_CLN.png')
@@ -0,0 +1,470 @@
+#!/usr/bin/env python3
+"""
+Columnar, append-only log of diagnostic answers with vectorised reports.
+
+Each submission is stored as one row of small integers, one raw file per
+column in the log directory:
+
+    ts.u4        submission time (Unix seconds)
+    lead_id.u4   id in the lead intake database (0 when unknown)
+    modules.u1   bitmask of the selected modules; bit 7 = "Autre enjeu"
+    taille.u1    index in diagnostic_engine.TAILLES (0 = unknown)
+    delai.u1     index in diagnostic_engine.DELAIS
+    mode.u1      index in diagnostic_engine.MODES
+    priority.u1  first ranked priority: 0 = not ranked, 1..7 = module, 8 = autre
+
+Appends only add bytes at the end of each file (under a file lock). After an
+interrupted append, the columns are cut back to their common length. Reads
+memory-map the files. A report makes one np.bincount over the selected rows
+into a joint-count cube (module mask x taille x delai x mode x priority,
+230 400 cells), and another one for the trend. Every count and cross-tab is
+then a sum over that cube. Module counts multiply the 256 mask counts by a
+256 x 8 bit matrix. A time range is a slice (searchsorted) while rows are in
+time order.
+
+The log is fed by lead_intake.py (serve --analytics DIR) or backfilled from
+its SQLite database with the import command; rows are keyed by lead id, so
+importing twice adds nothing, and a lead whose live append failed is picked
+up by the next import even if later leads made it into the log.
+
+Example:
+    $ python diagnostic_analytics.py import --db leads.sqlite3
+    $ python diagnostic_analytics.py report --since 2026-01-01 --window month
+    $ python diagnostic_analytics.py bench --rows 5000000
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Iterable, Iterator, Optional, Sequence
+
+import numpy as np
+
+from diagnostic_engine import CUSTOM_MODULE, DELAIS, MODES, MODULES, PRIORITY_LABELS, TAILLES, DiagnosticAnswers
+
+try:
+    import fcntl
+except ImportError:  # Windows: appends are only serialised within the process
+    fcntl = None  # type: ignore[assignment]
+
+
+DEFAULT_LOG_DIR = Path(__file__).parent / "analytics"
+DEFAULT_DB = Path(__file__).parent / "leads.sqlite3"
+COLUMNS = {
+    "ts": np.dtype("<u4"),
+    "lead_id": np.dtype("<u4"),
+    "modules": np.dtype("u1"),
+    "taille": np.dtype("u1"),
+    "delai": np.dtype("u1"),
+    "mode": np.dtype("u1"),
+    "priority": np.dtype("u1"),
+}
+CUSTOM_BIT = 7
+MODULE_NAMES = MODULES + (CUSTOM_MODULE,)
+MODULE_LABELS = tuple(PRIORITY_LABELS[value] for value in MODULES) + ("Autre enjeu",)
+PRIORITY_CODES = ("",) + MODULE_NAMES
+# MASK_BITS[mask, bit] == 1 when module `bit` is selected in `mask`.
+MASK_BITS = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1, bitorder="little").astype(np.int64)
+DIMENSIONS = {
+    "taille": TAILLES,
+    "delai": DELAIS,
+    "mode": MODES,
+    "priority": PRIORITY_CODES,
+}
+WINDOWS = ("day", "week", "month")
+DAY = 86_400
+
+
+# --------------------------------------------------------------------------- encoding
+
+
+def encode(answers: DiagnosticAnswers, ts: float, lead_id: int = 0) -> tuple[int, ...]:
+    """Row of codes in COLUMNS order."""
+    mask = 0
+    for value in answers.modules:
+        if value in MODULES:
+            mask |= 1 << MODULES.index(value)
+    if answers.custom:
+        mask |= 1 << CUSTOM_BIT
+
+    priority = 0
+    if answers.priority and answers.priority[0] in MODULE_NAMES:
+        priority = MODULE_NAMES.index(answers.priority[0]) + 1
+
+    def code(values: Sequence[str], value: str) -> int:
+        return values.index(value) if value in values else 0
+
+    return (
+        int(ts),
+        lead_id,
+        mask,
+        code(TAILLES, answers.taille),
+        code(DELAIS, answers.delai),
+        code(MODES, answers.mode),
+        priority,
+    )
+
+
+# --------------------------------------------------------------------------- storage
+
+
+class DiagnosticLog:
+    """Append-only column files in one directory."""
+
+    def __init__(self, directory: Path = DEFAULT_LOG_DIR):
+        self.directory = directory
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> Path:
+        return self.directory / f"{name}.{COLUMNS[name].kind}{COLUMNS[name].itemsize}"
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock, open(self.directory / ".lock", "a") as handle:
+            if fcntl is not None:
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(handle, fcntl.LOCK_UN)
+
+    def _lengths(self) -> dict[str, int]:
+        lengths = {}
+        for name, dtype in COLUMNS.items():
+            path = self._path(name)
+            lengths[name] = path.stat().st_size // dtype.itemsize if path.exists() else 0
+        return lengths
+
+    def __len__(self) -> int:
+        return min(self._lengths().values())
+
+    def append(self, rows: Iterable[Sequence[int]]) -> int:
+        """Append rows of codes (COLUMNS order); returns the number written."""
+        if not isinstance(rows, np.ndarray):
+            rows = list(rows)
+        table = np.asarray(rows, dtype=np.int64).reshape(-1, len(COLUMNS))
+        if not len(table):
+            return 0
+        with self._locked():
+            lengths = self._lengths()
+            common = min(lengths.values())
+            for index, (name, dtype) in enumerate(COLUMNS.items()):
+                with open(self._path(name), "ab") as handle:
+                    if lengths[name] != common:  # repair a torn append
+                        handle.truncate(common * dtype.itemsize)
+                    handle.write(table[:, index].astype(dtype).tobytes())
+        return len(table)
+
+    def columns(self) -> dict[str, np.ndarray]:
+        """Read-only memory maps, all cut to the common length."""
+        count = len(self)
+        columns = {}
+        for name, dtype in COLUMNS.items():
+            if count == 0:
+                columns[name] = np.zeros(0, dtype=dtype)
+            else:
+                columns[name] = np.memmap(self._path(name), dtype=dtype, mode="r", shape=(count,))
+        return columns
+
+    def lead_ids(self) -> set[int]:
+        """Lead ids already in the log (0, for rows without a lead, is left out)."""
+        known = set(np.unique(self.columns()["lead_id"]).tolist())
+        known.discard(0)
+        return known
+
+
+def import_leads(log: DiagnosticLog, db_path: Path, batch: int = 10_000) -> int:
+    """Append the diagnostics of every lead missing from the log, whatever its id."""
+    known = log.lead_ids()
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        cursor = conn.execute("SELECT id, received_at, diagnostic FROM leads WHERE diagnostic != '' ORDER BY id")
+        imported = 0
+        while True:
+            chunk = cursor.fetchmany(batch)
+            if not chunk:
+                return imported
+            missing = [row for row in chunk if row[0] not in known]
+            imported += log.append(
+                encode(DiagnosticAnswers.from_mapping(json.loads(diagnostic)), received_at, lead_id)
+                for lead_id, received_at, diagnostic in missing
+            )
+            known.update(lead_id for lead_id, _, _ in missing)
+    finally:
+        conn.close()
+
+
+# --------------------------------------------------------------------------- aggregations
+
+
+def select(columns: dict[str, np.ndarray], since: Optional[int] = None, until: Optional[int] = None) -> dict[str, np.ndarray]:
+    """Rows with since <= ts < until; slices (no copy) when ts is in append order."""
+    if since is None and until is None:
+        return columns
+    ts = columns["ts"]
+    if len(ts) < 2 or bool(np.all(ts[1:] >= ts[:-1])):
+        lo = 0 if since is None else int(np.searchsorted(ts, since, side="left"))
+        hi = len(ts) if until is None else int(np.searchsorted(ts, until, side="left"))
+        return {name: column[lo:hi] for name, column in columns.items()}
+    where = np.ones(len(ts), dtype=bool)
+    if since is not None:
+        where &= ts >= since
+    if until is not None:
+        where &= ts < until
+    return {name: column[where] for name, column in columns.items()}
+
+
+def cube(columns: dict[str, np.ndarray]) -> np.ndarray:
+    """Joint counts, shape (256 module masks, *DIMENSIONS), from a single pass over the rows."""
+    shape = (256,) + tuple(len(values) for values in DIMENSIONS.values())
+    key = columns["modules"].astype(np.uint32)
+    for name, size in zip(DIMENSIONS, shape[1:]):
+        key *= np.uint32(size)
+        key += columns[name]
+    return np.bincount(key, minlength=int(np.prod(shape))).reshape(shape)
+
+
+def _axis(name: str) -> int:
+    return 0 if name == "modules" else list(DIMENSIONS).index(name) + 1
+
+
+def module_counts(counts: np.ndarray) -> np.ndarray:
+    """Submissions per module (length 8, last = Autre enjeu); a submission counts once per module."""
+    return counts.sum(axis=tuple(range(1, counts.ndim))) @ MASK_BITS
+
+
+def value_counts(counts: np.ndarray, name: str) -> np.ndarray:
+    axis = _axis(name)
+    return counts.sum(axis=tuple(index for index in range(counts.ndim) if index != axis))
+
+
+def crosstab(counts: np.ndarray, row: str, col: str) -> np.ndarray:
+    """Counts of ``row`` x ``col``; "modules" on either side counts each selected module."""
+    rows, cols = _axis(row), _axis(col)
+    table = counts.sum(axis=tuple(index for index in range(counts.ndim) if index not in (rows, cols)))
+    if rows > cols:
+        table = table.T
+    if row == "modules":
+        table = MASK_BITS.T @ table
+    if col == "modules":
+        table = table @ MASK_BITS
+    return table
+
+
+def window_index(ts: np.ndarray, window: str) -> tuple[np.ndarray, int]:
+    """Window number of each timestamp (from 0), and the absolute number of the first window."""
+    days = ts // np.uint32(DAY)
+    first = int(days.min())
+    if window == "day":
+        return days - np.uint32(first), first
+    if window == "week":
+        weeks = (days + np.uint32(3)) // np.uint32(7)  # weeks start on Monday (1970-01-01 was a Thursday)
+        start = (first + 3) // 7
+        return weeks - np.uint32(start), start
+    # Months: look the day up in a table covering the range, instead of converting every row.
+    span = np.arange(first, int(days.max()) + 1).astype("datetime64[D]").astype("datetime64[M]").astype(np.int64)
+    start = int(span[0])
+    return (span - start).astype(np.uint32)[days - np.uint32(first)], start
+
+
+def window_label(number: int, window: str) -> str:
+    if window == "day":
+        return str(np.datetime64(number, "D"))
+    if window == "week":
+        return str(np.datetime64(number * 7 - 3, "D"))
+    return str(np.datetime64(number, "M"))
+
+
+def trend(columns: dict[str, np.ndarray], window: str = "week") -> tuple[list[str], np.ndarray, np.ndarray]:
+    """Window labels, submissions per window and module counts per window."""
+    if not len(columns["ts"]):
+        return [], np.zeros(0, dtype=np.int64), np.zeros((0, len(MODULE_NAMES)), dtype=np.int64)
+    index, start = window_index(columns["ts"], window)
+    windows = int(index.max()) + 1
+    index *= np.uint32(256)
+    index += columns["modules"]
+    per_mask = np.bincount(index, minlength=windows * 256).reshape(windows, 256)
+    totals = per_mask.sum(axis=1)
+    return [window_label(start + number, window) for number in range(windows)], totals, per_mask @ MASK_BITS
+
+
+# --------------------------------------------------------------------------- report
+
+
+def _label(name: str, code: int) -> str:
+    if name == "priority":
+        return "Non classé" if code == 0 else MODULE_LABELS[code - 1]
+    return DIMENSIONS[name][code] or "(non renseigné)"
+
+
+def build_report(
+    columns: dict[str, np.ndarray],
+    *,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    window: str = "week",
+) -> dict:
+    columns = select(columns, since, until)
+    ts = columns["ts"]
+    total = len(ts)
+    counts = cube(columns)
+    labels, totals, per_window = trend(columns, window)
+    return {
+        "submissions": total,
+        "first": datetime.fromtimestamp(int(ts.min()), timezone.utc).isoformat() if total else None,
+        "last": datetime.fromtimestamp(int(ts.max()), timezone.utc).isoformat() if total else None,
+        "modules": dict(zip(MODULE_LABELS, module_counts(counts).tolist())),
+        **{
+            name: {_label(name, code): int(count) for code, count in enumerate(value_counts(counts, name))}
+            for name in DIMENSIONS
+        },
+        "taille_x_modules": {
+            _label("taille", code): dict(zip(MODULE_LABELS, row.tolist()))
+            for code, row in enumerate(crosstab(counts, "taille", "modules"))
+        },
+        "trend": {
+            "window": window,
+            "periods": [
+                {"start": label, "submissions": int(count), "modules": dict(zip(MODULE_NAMES, row.tolist()))}
+                for label, count, row in zip(labels, totals, per_window)
+                if count
+            ],
+        },
+    }
+
+
+def _print_counts(title: str, counts: dict[str, int], total: int) -> None:
+    print(f"\n{title}")
+    for label, count in counts.items():
+        share = count / total * 100 if total else 0.0
+        print(f"  {label:<40} {count:>10}  {share:5.1f}%")
+
+
+def print_report(report: dict) -> None:
+    total = report["submissions"]
+    print(f"Diagnostic submissions: {total}" + (f" ({report['first']} -> {report['last']})" if total else ""))
+    if not total:
+        return
+    _print_counts("Modules (several per submission)", report["modules"], total)
+    _print_counts("Taille", report["taille"], total)
+    _print_counts("Horizon", report["delai"], total)
+    _print_counts("Mode d'accompagnement", report["mode"], total)
+    _print_counts("Priorité #1", report["priority"], total)
+
+    short = [name[:6] for name in MODULE_NAMES]
+    print("\nTaille x modules")
+    print(f"  {'':<26}" + "".join(f"{name:>9}" for name in short))
+    for label, row in report["taille_x_modules"].items():
+        print(f"  {label:<26}" + "".join(f"{count:>9}" for count in row.values()))
+
+    print(f"\nTrend by {report['trend']['window']}")
+    print(f"  {'start':<12}{'total':>9}" + "".join(f"{name:>9}" for name in short))
+    for period in report["trend"]["periods"]:
+        print(
+            f"  {period['start']:<12}{period['submissions']:>9}"
+            + "".join(f"{count:>9}" for count in period["modules"].values())
+        )
+
+
+# --------------------------------------------------------------------------- cli
+
+
+def _date(value: str) -> int:
+    return int(datetime.fromisoformat(value).replace(tzinfo=timezone.utc).timestamp())
+
+
+def synthetic_rows(count: int, seed: int = 0, days: int = 730) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    start = int(time.time()) - days * DAY
+    rows = np.empty((count, len(COLUMNS)), dtype=np.int64)
+    rows[:, 0] = np.sort(rng.integers(start, start + days * DAY, count))
+    rows[:, 1] = 0
+    rows[:, 2] = rng.integers(0, 256, count)
+    rows[:, 3] = rng.integers(1, len(TAILLES), count)
+    rows[:, 4] = rng.integers(1, len(DELAIS), count)
+    rows[:, 5] = rng.integers(1, len(MODES), count)
+    rows[:, 6] = rng.integers(0, len(PRIORITY_CODES), count)
+    return rows
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Columnar analytics of diagnostic submissions.")
+    parser.add_argument("--dir", type=Path, default=DEFAULT_LOG_DIR, help="Log directory (default: analytics/).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    imports = commands.add_parser("import", help="Append new diagnostics from the lead intake database.")
+    imports.add_argument("--db", type=Path, default=DEFAULT_DB, help="lead_intake SQLite database.")
+
+    report = commands.add_parser("report", help="Counts, cross-tab and trend.")
+    report.add_argument("--since", type=_date, help="Start date (YYYY-MM-DD, UTC).")
+    report.add_argument("--until", type=_date, help="End date, exclusive (YYYY-MM-DD, UTC).")
+    report.add_argument("--window", choices=WINDOWS, default="week", help="Trend window (default: week).")
+    report.add_argument("--json", action="store_true", help="Print the report as JSON.")
+
+    bench = commands.add_parser("bench", help="Time the report on a synthetic log.")
+    bench.add_argument("--rows", type=int, default=1_000_000, help="Synthetic submissions (default: 1000000).")
+    bench.add_argument("--window", choices=WINDOWS, default="week")
+    return parser
+
+
+def main(argv: list[str]) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.command == "import":
+        if not args.db.exists():
+            raise SystemExit(f"Database not found: {args.db}")
+        log = DiagnosticLog(args.dir)
+        imported = import_leads(log, args.db)
+        print(f"{imported} diagnostic(s) imported, {len(log)} in the log.")
+        return 0
+
+    if args.command == "bench":
+        with tempfile.TemporaryDirectory() as tmp:
+            log = DiagnosticLog(Path(tmp))
+            start = time.perf_counter()
+            log.append(synthetic_rows(args.rows))
+            print(f"Appended {args.rows} rows in {(time.perf_counter() - start) * 1000:.0f} ms")
+            columns = log.columns()
+            counts = cube(columns)
+            for label, func in (
+                ("joint counts (cube)", lambda: cube(columns)),
+                ("module counts", lambda: module_counts(counts)),
+                ("taille x modules", lambda: crosstab(counts, "taille", "modules")),
+                (f"trend by {args.window}", lambda: trend(columns, args.window)),
+                ("full report", lambda: build_report(columns, window=args.window)),
+                ("report, last 90 days", lambda: build_report(columns, since=int(time.time()) - 90 * DAY)),
+            ):
+                func()
+                start = time.perf_counter()
+                func()
+                print(f"  {label:<22} {(time.perf_counter() - start) * 1000:8.1f} ms")
+            del columns
+        return 0
+
+    if not args.dir.is_dir():
+        raise SystemExit(f"No analytics log in {args.dir} (run the import command first).")
+    log = DiagnosticLog(args.dir)
+    start = time.perf_counter()
+    report = build_report(log.columns(), since=args.since, until=args.until, window=args.window)
+    elapsed = time.perf_counter() - start
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+        print(f"\nComputed in {elapsed * 1000:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Server-side port of the diagnostic questionnaire (pages/diagnostic.html).
+
+The recommendation shown in the browser is built from five lines
+(organisationLine, moduleSummary, prioritySummary, recommendationLine,
+nextStepLine). Every answer except the free "Autre enjeu" text is finite,
+so each line is precomputed at import time into a table indexed by small
+integer codes:
+
+- profile line: taille x delai (5 x 5);
+- module summary: bitmask of the 7 modules (128);
+- priority summary: every ordered arrangement of the modules (13 700);
+- recommendation line: first priority (8);
+- next step: delai x mode (5 x 4).
+
+recommend() is then a handful of tuple/dict lookups. Only answers that
+involve the custom text are assembled per request, by the same functions
+that fill the tables. These functions are a line-by-line port of the page
+script, HTML escaping included, so the strings are identical to the
+meta lines the browser stores in localStorage.
+
+Example:
+    $ python diagnostic_engine.py show --modules connecter,normaliser --taille moyenne \\
+        --delai court --mode flash --priority normaliser,connecter
+    $ python diagnostic_engine.py check    # compare with the JavaScript through node
+"""
+
+from __future__ import annotations
+
+import argparse
+import html
+import itertools
+import json
+import random
+import re
+import shutil
+import subprocess
+import sys
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterable, Mapping, Optional, Sequence
+
+
+DIAGNOSTIC_PAGE = Path(__file__).resolve().parent.parent / "pages" / "diagnostic.html"
+CUSTOM_MODULE = "autre"
+MAX_CUSTOM_LENGTH = 200
+
+# Codes: index in each tuple. The empty string (code 0) stands for a missing or unknown answer.
+MODULES = ("connecter", "liberer", "normaliser", "securiser", "valoriser", "collaborer", "anticiper")
+TAILLES = ("", "petite", "moyenne", "grande", "tresgrande")
+DELAIS = ("", "court", "moyen", "long", "incertain")
+MODES = ("", "flash", "projet", "hybride")
+
+PRIORITY_LABELS = {
+    "connecter": "Connecter · Interopérabilité",
+    "liberer": "Libérer · Automatisation",
+    "normaliser": "Normaliser · Gouvernance des données",
+    "securiser": "Sécuriser · Conformité",
+    "valoriser": "Valoriser · Analytics",
+    "collaborer": "Collaborer · Partage",
+    "anticiper": "Anticiper · Innovation",
+}
+MODULE_SENTENCES = {
+    "connecter": "Connecter vos systèmes et données pour une interopérabilité fluide.",
+    "liberer": "Libérer du temps via l'automatisation de vos processus clés.",
+    "normaliser": "Normaliser votre patrimoine de données pour sécuriser la décision.",
+    "securiser": "Sécuriser vos environnements et répondre aux exigences de conformité.",
+    "valoriser": "Valoriser vos données grâce à des analyses actionnables.",
+    "collaborer": "Faciliter la collaboration autour d'espaces de partage unifiés.",
+    "anticiper": "Anticiper les évolutions par l'innovation et l'expérimentation.",
+}
+RECOMMENDATIONS = {
+    "connecter": "Nous recommandons de prioriser un chantier d'interopérabilité pour fluidifier les échanges entre vos systèmes clés.",
+    "liberer": "Nous recommandons de lancer une séquence d'automatisation sur vos processus métiers critiques pour générer des gains rapides.",
+    "normaliser": "Nous recommandons de cadrer un programme de gouvernance des données afin de fiabiliser vos référentiels et décisions.",
+    "securiser": "Nous recommandons de bâtir une feuille de route conformité/sécurité pour renforcer vos environnements numériques.",
+    "valoriser": "Nous recommandons de mettre en place un socle analytics partagé pour valoriser vos données et éclairer les décisions.",
+    "collaborer": "Nous recommandons de structurer des espaces collaboratifs sécurisés pour fluidifier le partage entre équipes.",
+    "anticiper": "Nous recommandons de réserver un sprint d'innovation pour tester et préparer vos futurs cas d'usage.",
+}
+DELAI_MESSAGES = {
+    "court": "Nous pouvons organiser un atelier d'immersion dans les 7 prochains jours pour cadrer les premières actions.",
+    "moyen": "Planifions un rendez-vous découverte afin de co-construire une feuille de route sur le semestre.",
+    "long": "Nous vous proposons un échange stratégique pour bâtir un programme progressif et maîtrisé.",
+    "incertain": "Clarifions ensemble le calendrier lors d'un échange exploratoire.",
+}
+MODE_MESSAGES = {
+    "flash": "Un diagnostic flash de 3 à 4 ateliers permettrait de prioriser vos chantiers.",
+    "projet": "Nous pouvons constituer une équipe projet CLN pour piloter vos livrables de bout en bout.",
+    "hybride": "Notre modèle hybride combine coaching de vos équipes et expertises ciblées CLN.",
+}
+HORIZON_LABELS = {
+    "court": "un horizon court terme (< 3 mois)",
+    "moyen": "un horizon à moyen terme (3 à 6 mois)",
+    "long": "un horizon à plus de 6 mois",
+    "incertain": "un horizon encore à préciser",
+}
+TAILLE_LABELS = {
+    "petite": "une organisation agile en croissance",
+    "moyenne": "une structure en phase de structuration",
+    "grande": "un groupe établi avec plusieurs équipes métiers",
+    "tresgrande": "un grand groupe international avec plusieurs entités",
+}
+NO_MODULE_SUMMARY = "Nous vous proposons un diagnostic transversal pour identifier les priorités CLN."
+PRIORITY_DISABLED = (
+    "Vous n'avez pas activé le classement des priorités pour le moment. "
+    "Activez l'option ci-dessus pour définir un ordre."
+)
+PRIORITY_EMPTY = "Vous n'avez pas encore classé vos priorités."
+DEFAULT_RECOMMENDATION = "Explorons ensemble vos enjeux pour définir le plan d'action prioritaire."
+NO_PRIORITY_HIGHLIGHT = "Priorité #1 : à déterminer (classement optionnel non activé)."
+DEFAULT_NEXT_STEP = "Planifions un échange pour préciser les prochaines étapes."
+
+
+# --------------------------------------------------------------------------- port of the page script
+
+
+def escape_html(text: str) -> str:
+    return (
+        text.replace("&", "&amp;")
+        .replace("<", "&lt;")
+        .replace(">", "&gt;")
+        .replace('"', "&quot;")
+        .replace("'", "&#39;")
+    )
+
+
+def ensure_trailing_punctuation(text: str) -> str:
+    return "" if re.search(r"[.!?]$", text.strip()) else "."
+
+
+def build_module_summary(modules: Iterable[str], custom_text: str = "") -> str:
+    sentences = [MODULE_SENTENCES[value] for value in modules if value in MODULE_SENTENCES]
+    if custom_text:
+        safe_text = escape_html(custom_text.strip())
+        sentences.append(f"Vous mettez aussi en avant : {safe_text}{ensure_trailing_punctuation(custom_text)}")
+    if not sentences:
+        return NO_MODULE_SUMMARY
+    return " ".join(sentences)
+
+
+def recommendation_from_priority(priority: str, custom_label: str = "") -> str:
+    if priority in RECOMMENDATIONS:
+        return RECOMMENDATIONS[priority]
+    if priority == CUSTOM_MODULE and custom_label:
+        return f"Nous construirons avec vous un plan d'action spécifique autour de «\u00a0{escape_html(custom_label)}\u00a0»."
+    return DEFAULT_RECOMMENDATION
+
+
+def rendez_vous_message(delai: str, mode: str) -> str:
+    return f"{DELAI_MESSAGES.get(delai, '')} {MODE_MESSAGES.get(mode, '')}".strip()
+
+
+def horizon_summary(delai: str) -> str:
+    return HORIZON_LABELS.get(delai, "un horizon à définir")
+
+
+def build_priority_order_summary(labels: Sequence[str], enabled: bool) -> str:
+    if not enabled:
+        return PRIORITY_DISABLED
+    if not labels:
+        return PRIORITY_EMPTY
+    readable = " | ".join(f"{index}. {escape_html(label)}" for index, label in enumerate(labels, start=1))
+    return f"Priorités classées : {readable}."
+
+
+def organisation_line(taille: str, delai: str) -> str:
+    return f"Vous êtes {TAILLE_LABELS.get(taille, 'une organisation')} avec {horizon_summary(delai)}."
+
+
+def recommendation_line(priority: str, label: str, enabled: bool) -> str:
+    highlight = f"Priorité #1 : {escape_html(label)}." if enabled and label else NO_PRIORITY_HIGHLIGHT
+    return f"{highlight} {recommendation_from_priority(priority, label)}"
+
+
+def next_step_line(delai: str, mode: str) -> str:
+    return rendez_vous_message(delai, mode) or DEFAULT_NEXT_STEP
+
+
+# --------------------------------------------------------------------------- precomputed tables
+
+
+def _module_label(value: str, custom: str) -> str:
+    return custom if value == CUSTOM_MODULE else PRIORITY_LABELS[value]
+
+
+def _order_key(order: Sequence[str]) -> int:
+    """Pack an order of known modules into one int (base 8, codes 1..7)."""
+    key = 0
+    for value in order:
+        key = key * 8 + MODULES.index(value) + 1
+    return key
+
+
+ORGANISATION_TABLE = tuple(organisation_line(taille, delai) for taille in TAILLES for delai in DELAIS)
+MODULE_TABLE = tuple(
+    build_module_summary([value for bit, value in enumerate(MODULES) if mask >> bit & 1]) for mask in range(1 << len(MODULES))
+)
+RECOMMENDATION_TABLE = (recommendation_line("", "", False),) + tuple(
+    recommendation_line(value, PRIORITY_LABELS[value], True) for value in MODULES
+)
+NEXT_STEP_TABLE = tuple(next_step_line(delai, mode) for delai in DELAIS for mode in MODES)
+PRIORITY_TABLE = {
+    _order_key(order): build_priority_order_summary([PRIORITY_LABELS[value] for value in order], True)
+    for size in range(len(MODULES) + 1)
+    for order in itertools.permutations(MODULES, size)
+}
+_CODES = {name: index for index, name in enumerate(MODULES)}
+_TAILLE_CODES = {name: index for index, name in enumerate(TAILLES)}
+_DELAI_CODES = {name: index for index, name in enumerate(DELAIS)}
+_MODE_CODES = {name: index for index, name in enumerate(MODES)}
+
+
+# --------------------------------------------------------------------------- public api
+
+
+@dataclass(frozen=True)
+class DiagnosticAnswers:
+    """Answers of the questionnaire; ``priority`` is None when ranking is not enabled."""
+
+    modules: tuple[str, ...] = ()
+    custom: str = ""
+    taille: str = ""
+    delai: str = ""
+    mode: str = ""
+    priority: Optional[tuple[str, ...]] = None
+
+    @classmethod
+    def from_mapping(cls, data: Mapping[str, object]) -> "DiagnosticAnswers":
+        """Normalise untrusted input (e.g. JSON posted with the contact form)."""
+
+        def text(key: str) -> str:
+            value = data.get(key)
+            return value.strip() if isinstance(value, str) else ""
+
+        custom = text("custom")[:MAX_CUSTOM_LENGTH]
+        raw_modules = data.get("modules")
+        selected = {value for value in raw_modules if isinstance(value, str)} if isinstance(raw_modules, list) else set()
+        modules = tuple(value for value in MODULES if value in selected)
+
+        priority: Optional[tuple[str, ...]] = None
+        raw_priority = data.get("priority")
+        if isinstance(raw_priority, list):
+            allowed = set(modules) | ({CUSTOM_MODULE} if custom else set())
+            priority = tuple(dict.fromkeys(value for value in raw_priority if value in allowed))
+        return cls(modules, custom, text("taille"), text("delai"), text("mode"), priority)
+
+
+@dataclass(frozen=True)
+class Recommendation:
+    organisation_line: str
+    module_summary: str
+    priority_summary: str
+    recommendation_line: str
+    next_step_line: str
+
+    def lines(self) -> list[str]:
+        return [
+            self.organisation_line,
+            self.module_summary,
+            self.priority_summary,
+            self.recommendation_line,
+            self.next_step_line,
+        ]
+
+    def as_text(self) -> str:
+        """Plain text, one line per item, ready for email_service's summary block."""
+        return html.unescape("\n".join(self.lines()))
+
+    def as_html(self) -> str:
+        return (
+            f"<p><strong>Profil.</strong> {self.organisation_line}</p>\n"
+            f"<p><strong>Enjeux principaux.</strong> {self.module_summary}</p>\n"
+            f"<p><strong>Feuille de route 6 mois.</strong> {self.priority_summary} {self.recommendation_line}</p>\n"
+            f"<p><strong>Prochain pas.</strong> {self.next_step_line}</p>"
+        )
+
+
+def recommend(answers: DiagnosticAnswers) -> Recommendation:
+    """Table lookups; strings are only assembled for answers carrying the custom text."""
+    delai = _DELAI_CODES.get(answers.delai, 0)
+    custom = answers.custom
+
+    mask = 0
+    for value in answers.modules:
+        if value in _CODES:
+            mask |= 1 << _CODES[value]
+    module_summary = MODULE_TABLE[mask] if not custom else build_module_summary(
+        [value for value in MODULES if mask >> _CODES[value] & 1], custom
+    )
+
+    order = answers.priority
+    if order is None:
+        priority_summary = PRIORITY_DISABLED
+        recommendation = RECOMMENDATION_TABLE[0]
+    elif CUSTOM_MODULE in order:
+        labels = [_module_label(value, custom) for value in order]
+        priority_summary = build_priority_order_summary(labels, True)
+        recommendation = recommendation_line(order[0], labels[0], True)
+    else:
+        priority_summary = PRIORITY_TABLE[_order_key(order)]
+        recommendation = RECOMMENDATION_TABLE[_CODES[order[0]] + 1] if order else RECOMMENDATION_TABLE[0]
+
+    return Recommendation(
+        organisation_line=ORGANISATION_TABLE[_TAILLE_CODES.get(answers.taille, 0) * len(DELAIS) + delai],
+        module_summary=module_summary,
+        priority_summary=priority_summary,
+        recommendation_line=recommendation,
+        next_step_line=NEXT_STEP_TABLE[delai * len(MODES) + _MODE_CODES.get(answers.mode, 0)],
+    )
+
+
+# --------------------------------------------------------------------------- consistency check
+
+_JS_FUNCTIONS = (
+    "escapeHtml",
+    "ensureTrailingPunctuation",
+    "buildPriorityOrderSummary",
+    "buildModuleSummary",
+    "recommendationFromPriority",
+    "rendezVousMessage",
+    "horizonSummary",
+)
+
+_JS_HARNESS = """
+%(definitions)s
+function compose(c) {
+  const modules = c.modules;
+  const customModule = c.custom;
+  const taille = c.taille;
+  const delai = c.delai;
+  const mode = c.mode;
+  const priorityEnabled = c.priority !== null;
+  const priorityOrder = priorityEnabled
+    ? c.priority.map((value) => ({ value, label: value === 'autre' ? c.custom : PRIORITY_LABELS[value] }))
+    : [];
+  const prioriteEntry = priorityEnabled ? priorityOrder[0] || null : null;
+  const priorite = prioriteEntry ? prioriteEntry.value : '';
+%(composition)s
+  return [organisationLine, moduleSummary, prioritySummary, recommendationLine, nextStepLine];
+}
+let input = '';
+process.stdin.on('data', (chunk) => { input += chunk; });
+process.stdin.on('end', () => { process.stdout.write(JSON.stringify(JSON.parse(input).map(compose))); });
+"""
+
+
+def _extract_block(source: str, start: int) -> str:
+    """Return source[start:] up to the brace closing the first block opened after start."""
+    depth = 0
+    for index in range(source.index("{", start), len(source)):
+        depth += {"{": 1, "}": -1}.get(source[index], 0)
+        if depth == 0:
+            return source[start : index + 1]
+    raise ValueError("unbalanced braces in diagnostic.html")
+
+
+def javascript_harness(page: Path = DIAGNOSTIC_PAGE) -> str:
+    """Node script evaluating the page's own functions and submit-handler composition."""
+    script = page.read_text(encoding="utf-8")
+    definitions = [_extract_block(script, script.index("const PRIORITY_LABELS")) + ";"]
+    for name in _JS_FUNCTIONS:
+        definitions.append(_extract_block(script, script.index(f"function {name}(")))
+    start = script.index("const tailleLabel")
+    end = script.index("\n", script.index("const nextStepLine"))
+    return _JS_HARNESS % {"definitions": "\n".join(definitions), "composition": script[start:end]}
+
+
+def consistency_cases(samples: int, seed: int) -> list[DiagnosticAnswers]:
+    rng = random.Random(seed)
+    cases = []
+    # Every module set crossed with every profile/horizon/mode, ranking disabled.
+    for mask in range(1 << len(MODULES)):
+        modules = tuple(value for bit, value in enumerate(MODULES) if mask >> bit & 1)
+        for taille, delai, mode in itertools.product(TAILLES, DELAIS, MODES):
+            cases.append(DiagnosticAnswers(modules, "", taille, delai, mode, None))
+    # Every ranked order of every module set.
+    for size in range(len(MODULES) + 1):
+        for order in itertools.permutations(MODULES, size):
+            modules = tuple(value for value in MODULES if value in order)
+            cases.append(DiagnosticAnswers(modules, "", rng.choice(TAILLES), rng.choice(DELAIS), rng.choice(MODES), order))
+    # Random answers with custom text, including characters that are HTML-escaped.
+    customs = ["Cybersécurité OT", "R&D <labo> \"x\" l'usine", "Données patients ?", "Migration ERP!"]
+    for _ in range(samples):
+        modules = tuple(value for value in MODULES if rng.random() < 0.4)
+        custom = rng.choice(customs)
+        ranked = list(modules) + [CUSTOM_MODULE]
+        rng.shuffle(ranked)
+        priority = tuple(ranked) if rng.random() < 0.7 else None
+        cases.append(DiagnosticAnswers(modules, custom, rng.choice(TAILLES), rng.choice(DELAIS), rng.choice(MODES), priority))
+    return cases
+
+
+def check_against_javascript(samples: int = 2000, seed: int = 0) -> int:
+    node = shutil.which("node")
+    if node is None:
+        raise SystemExit("node is required for the consistency check.")
+    cases = consistency_cases(samples, seed)
+    payload = json.dumps(
+        [
+            {
+                "modules": list(case.modules),
+                "custom": case.custom,
+                "taille": case.taille,
+                "delai": case.delai,
+                "mode": case.mode,
+                "priority": list(case.priority) if case.priority is not None else None,
+            }
+            for case in cases
+        ]
+    )
+    result = subprocess.run(
+        [node, "-e", javascript_harness()], input=payload, capture_output=True, text=True, check=True
+    )
+    expected = json.loads(result.stdout)
+
+    mismatches = 0
+    for case, js_lines in zip(cases, expected):
+        py_lines = recommend(case).lines()
+        if py_lines != js_lines:
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"[ERROR] {case}", file=sys.stderr)
+                for py_line, js_line in zip(py_lines, js_lines):
+                    if py_line != js_line:
+                        print(f"  python: {py_line}\n  js:     {js_line}", file=sys.stderr)
+    print(f"{len(cases)} case(s) compared with diagnostic.html, {mismatches} mismatch(es).")
+    return 1 if mismatches else 0
+
+
+# --------------------------------------------------------------------------- cli
+
+
+def _csv(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Diagnostic recommendation engine (port of diagnostic.html).")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    show = commands.add_parser("show", help="Print the recommendation for a set of answers.")
+    show.add_argument("--modules", type=_csv, default=[], help="Comma-separated modules, e.g. connecter,liberer.")
+    show.add_argument("--custom", default="", help="'Autre enjeu' text.")
+    show.add_argument("--taille", default="", choices=TAILLES)
+    show.add_argument("--delai", default="", choices=DELAIS)
+    show.add_argument("--mode", default="", choices=MODES)
+    show.add_argument("--priority", type=_csv, help="Ranked modules (omit when ranking is not enabled).")
+    show.add_argument("--html", action="store_true", help="Print the HTML block instead of text lines.")
+
+    check = commands.add_parser("check", help="Compare every table entry with the JavaScript (needs node).")
+    check.add_argument("--samples", type=int, default=2000, help="Random answers with custom text (default: 2000).")
+    check.add_argument("--seed", type=int, default=0)
+    return parser
+
+
+def main(argv: list[str]) -> int:
+    args = build_parser().parse_args(argv)
+    if args.command == "check":
+        return check_against_javascript(args.samples, args.seed)
+
+    answers = DiagnosticAnswers.from_mapping(
+        {
+            "modules": args.modules,
+            "custom": args.custom,
+            "taille": args.taille,
+            "delai": args.delai,
+            "mode": args.mode,
+            "priority": args.priority,
+        }
+    )
+    result = recommend(answers)
+    print(result.as_html() if args.html else result.as_text())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,585 @@
+#!/usr/bin/env python3
+"""
+Lead intake service for the contact form: durable write first, email later.
+
+A WSGI replacement for contact.php. The form fields and validation are the
+same (name, _replyto, company, message, consent), but the lead is stored
+before any email is sent:
+
+1. The POST is validated like contact.php (CR/LF stripped, trimmed, email
+   syntax, consent checked) and the visitor gets the same 303 redirects.
+2. The lead is written to SQLite (WAL, synchronous=FULL) by a single writer
+   thread. Concurrent submissions are grouped into one fsync'd transaction,
+   so a burst of hundreds of posts per second costs a few commits rather
+   than hundreds.
+3. The redirect to merci.html?status=success is sent as soon as the commit
+   returns. The internal notification and the visitor confirmation are sent
+   in the background by email_service, with the diagnostic summary
+   recomputed server-side by diagnostic_engine from the raw answers the
+   contact form posts (never from client-built text). Failures are retried with
+   exponential backoff, and pending leads survive a restart. A lead is
+   never lost because the mail transport is slow or down. Each dispatcher
+   claims a lead in the database (state 'sending' with a lease) before
+   sending it, so several processes can share one database without
+   emailing a lead twice; a lead whose lease expires (crashed process) is
+   claimed again.
+
+Example:
+    $ python lead_intake.py serve --db leads.sqlite3 --port 8080 --analytics analytics
+    $ python lead_intake.py status --db leads.sqlite3
+    $ python lead_intake.py requeue --db leads.sqlite3
+
+Any WSGI server can host the module-level ``application`` (configured with
+the LEAD_INTAKE_* environment variables), e.g.:
+    $ gunicorn --chdir PRESENTATION_PPT --threads 16 lead_intake:application
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import queue
+import re
+import sqlite3
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from socketserver import ThreadingMixIn
+from typing import Callable, Optional
+from urllib.parse import parse_qs
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from diagnostic_engine import DiagnosticAnswers, recommend
+
+
+ENV_PREFIX = "LEAD_INTAKE_"
+DEFAULT_DB = Path(__file__).parent / "leads.sqlite3"
+SUCCESS_REDIRECT = "merci.html?status=success"
+INVALID_REDIRECT = "contact.html?status=invalid"
+ERROR_REDIRECT = "contact.html?status=error"
+FALLBACK_REDIRECT = "contact.html"
+MAX_BODY_BYTES = 64 * 1024
+MAX_DIAGNOSTIC_BYTES = 4096
+MAX_BATCH = 256
+# How long a claimed lead stays reserved for the dispatcher that is sending it.
+DELIVERY_LEASE = 900.0
+PHP_TRIM = " \t\n\r\0\x0b"
+
+# Close to PHP's FILTER_VALIDATE_EMAIL: dot-atom local part, dotted domain of LDH labels.
+EMAIL_RE = re.compile(
+    r"^(?=.{1,254}$)(?=.{1,64}@)"
+    r"[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+(?:\.[A-Za-z0-9!#$%&'*+/=?^_`{|}~-]+)*"
+    r"@(?:[A-Za-z0-9](?:[A-Za-z0-9-]{0,61}[A-Za-z0-9])?\.)+[A-Za-z]{2,63}$"
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS leads (
+    id INTEGER PRIMARY KEY,
+    received_at REAL NOT NULL,
+    name TEXT NOT NULL,
+    email TEXT NOT NULL,
+    company TEXT NOT NULL,
+    message TEXT NOT NULL,
+    diagnostic TEXT NOT NULL DEFAULT '',
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    notified_at REAL,
+    confirmed_at REAL,
+    last_error TEXT
+);
+CREATE INDEX IF NOT EXISTS leads_due ON leads (state, next_attempt_at);
+"""
+
+
+def env_default(name: str, fallback: Optional[str] = None) -> Optional[str]:
+    """Read a default value from the environment."""
+    return os.getenv(f"{ENV_PREFIX}{name}") or fallback
+
+
+# --------------------------------------------------------------------------- validation
+
+
+@dataclass(frozen=True)
+class Lead:
+    name: str
+    email: str
+    company: str
+    message: str
+    diagnostic: str = ""
+
+
+def field_value(form: dict[str, list[str]], key: str) -> str:
+    """Same as field_value() in contact.php: drop CR/LF, then trim."""
+    raw = (form.get(key) or [""])[0]
+    return raw.replace("\r", "").replace("\n", "").strip(PHP_TRIM)
+
+
+def is_valid_email(value: str) -> bool:
+    return bool(EMAIL_RE.match(value))
+
+
+def parse_diagnostic(raw: str) -> str:
+    """Normalised JSON of the questionnaire answers, or "" when absent or malformed."""
+    if not raw or len(raw) > MAX_DIAGNOSTIC_BYTES:
+        return ""
+    try:
+        data = json.loads(raw)
+    except ValueError:
+        return ""
+    if not isinstance(data, dict):
+        return ""
+    return json.dumps(asdict(DiagnosticAnswers.from_mapping(data)), ensure_ascii=False)
+
+
+def parse_lead(form: dict[str, list[str]]) -> Optional[Lead]:
+    """Return the lead, or None when contact.php would redirect with status=invalid."""
+    name = field_value(form, "name")
+    email = field_value(form, "_replyto")
+    company = field_value(form, "company")
+    message = (form.get("message") or [""])[0].strip(PHP_TRIM)
+    message = re.sub(r"\r\n|\r", "\n", message)
+    consent = "consent" in form
+
+    if not name or not is_valid_email(email) or not message or not consent:
+        return None
+    diagnostic = parse_diagnostic((form.get("diagnostic") or [""])[0])
+    return Lead(name=name, email=email, company=company, message=message, diagnostic=diagnostic)
+
+
+# --------------------------------------------------------------------------- storage
+
+
+def connect(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path, isolation_level=None, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    # FULL makes every commit fsync the WAL: a lead acknowledged with a 303 survives a power cut.
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+class _PendingWrite:
+    __slots__ = ("lead", "done", "lead_id", "error")
+
+    def __init__(self, lead: Lead):
+        self.lead = lead
+        self.done = threading.Event()
+        self.lead_id: Optional[int] = None
+        self.error: Optional[BaseException] = None
+
+
+class LeadStore:
+    """SQLite lead table with a single group-committing writer thread."""
+
+    def __init__(self, path: Path, on_commit: Optional[Callable[[list[tuple[int, float, Lead]]], None]] = None):
+        self.path = path
+        self.on_commit = on_commit
+        self.commits = 0
+        self._queue: "queue.Queue[Optional[_PendingWrite]]" = queue.Queue()
+        self._local = threading.local()
+        # The connection's own context manager only commits; closing() releases it.
+        with closing(connect(path)) as conn, conn:
+            conn.executescript(SCHEMA)
+            columns = {row["name"] for row in conn.execute("PRAGMA table_info(leads)")}
+            if "diagnostic" not in columns:
+                conn.execute("ALTER TABLE leads ADD COLUMN diagnostic TEXT NOT NULL DEFAULT ''")
+        self._writer = threading.Thread(target=self._write_loop, name="lead-writer", daemon=True)
+        self._writer.start()
+
+    def conn(self) -> sqlite3.Connection:
+        """Per-thread connection for readers and delivery updates."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = connect(self.path)
+        return conn
+
+    def add(self, lead: Lead, timeout: float = 10.0) -> int:
+        """Persist the lead and return its id once the transaction is on disk."""
+        pending = _PendingWrite(lead)
+        self._queue.put(pending)
+        if not pending.done.wait(timeout):
+            raise TimeoutError("lead write not committed in time")
+        if pending.error is not None:
+            raise pending.error
+        assert pending.lead_id is not None
+        return pending.lead_id
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._writer.join()
+
+    def _write_loop(self) -> None:
+        conn = connect(self.path)
+        while True:
+            first = self._queue.get()
+            if first is None:
+                conn.close()
+                return
+            batch = [first]
+            stop = False
+            while len(batch) < MAX_BATCH:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._commit(conn, batch)
+            if stop:
+                conn.close()
+                return
+
+    def _commit(self, conn: sqlite3.Connection, batch: list[_PendingWrite]) -> None:
+        now = time.time()
+        committed: list[tuple[int, float, Lead]] = []
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            for pending in batch:
+                lead = pending.lead
+                cursor = conn.execute(
+                    "INSERT INTO leads (received_at, name, email, company, message, diagnostic, next_attempt_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (now, lead.name, lead.email, lead.company, lead.message, lead.diagnostic, now),
+                )
+                pending.lead_id = cursor.lastrowid
+            conn.execute("COMMIT")
+            self.commits += 1
+            committed = [(pending.lead_id, now, pending.lead) for pending in batch if pending.lead_id is not None]
+        except sqlite3.Error as exc:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            for pending in batch:
+                pending.lead_id = None
+                pending.error = exc
+        for pending in batch:
+            pending.done.set()
+        if self.on_commit is not None and committed:
+            self.on_commit(committed)
+
+    def claim(self, now: float, limit: int, lease: float = DELIVERY_LEASE) -> list[sqlite3.Row]:
+        """Reserve up to ``limit`` due leads for this process and return them.
+
+        Due means pending with next_attempt_at <= now, or 'sending' with an
+        expired lease. Each row is taken by a conditional UPDATE, so when
+        several processes poll the same database only one of them gets it.
+        """
+        conn = self.conn()
+        rows = conn.execute(
+            "SELECT * FROM leads WHERE state IN ('pending', 'sending') AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (now, limit),
+        ).fetchall()
+        claimed = []
+        for row in rows:
+            cursor = conn.execute(
+                "UPDATE leads SET state = 'sending', next_attempt_at = ?"
+                " WHERE id = ? AND state = ? AND next_attempt_at = ?",
+                (now + lease, row["id"], row["state"], row["next_attempt_at"]),
+            )
+            if cursor.rowcount == 1:
+                claimed.append(row)
+        return claimed
+
+    def mark(self, lead_id: int, **columns: object) -> None:
+        assignments = ", ".join(f"{name} = ?" for name in columns)
+        self.conn().execute(f"UPDATE leads SET {assignments} WHERE id = ?", (*columns.values(), lead_id))
+
+    def counts(self) -> dict[str, int]:
+        rows = self.conn().execute("SELECT state, COUNT(*) FROM leads GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+
+# --------------------------------------------------------------------------- delivery
+
+
+def send_lead_emails(lead: sqlite3.Row, need_notification: bool, need_confirmation: bool,
+                     mark: Callable[[str], None]) -> None:
+    """Send the missing emails through email_service, marking each one as soon as it is sent."""
+    from email_service import SMTPSettings, send_internal_notification_email, send_lead_confirmation_email
+
+    settings = SMTPSettings.from_env()
+    summary = None
+    if lead["diagnostic"]:
+        summary = recommend(DiagnosticAnswers.from_mapping(json.loads(lead["diagnostic"]))).as_text()
+    if need_notification:
+        send_internal_notification_email(
+            settings,
+            lead_name=lead["name"],
+            lead_email=lead["email"],
+            organisation=lead["company"] or None,
+            message_text=lead["message"],
+            summary=summary,
+        )
+        mark("notified_at")
+    if need_confirmation:
+        send_lead_confirmation_email(settings, lead["name"], lead["email"], summary=summary)
+        mark("confirmed_at")
+
+
+class MailDispatcher:
+    """Background delivery: polls due leads and sends their emails on a small thread pool."""
+
+    def __init__(
+        self,
+        store: LeadStore,
+        *,
+        workers: int = 4,
+        max_attempts: int = 8,
+        retry_base: float = 30.0,
+        poll_interval: float = 5.0,
+        sender: Callable[..., None] = send_lead_emails,
+    ):
+        self.store = store
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.poll_interval = poll_interval
+        self.sender = sender
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="lead-mail")
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._in_flight: set[int] = set()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, name="lead-dispatcher", daemon=True)
+
+    def start(self) -> "MailDispatcher":
+        self._thread.start()
+        return self
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._wake.set()
+        self._thread.join()
+        self._pool.shutdown(wait=True)
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            with self._lock:
+                room = self.workers * 4 - len(self._in_flight)
+            if room <= 0:
+                continue
+            for row in self.store.claim(time.time(), room):
+                with self._lock:
+                    self._in_flight.add(row["id"])
+                self._pool.submit(self._deliver, row)
+
+    def _deliver(self, row: sqlite3.Row) -> None:
+        lead_id = row["id"]
+        try:
+            self.sender(
+                row,
+                row["notified_at"] is None,
+                row["confirmed_at"] is None,
+                lambda column: self.store.mark(lead_id, **{column: time.time()}),
+            )
+            self.store.mark(lead_id, state="sent", last_error=None)
+        except Exception as exc:  # any transport/configuration error is retried later
+            attempts = row["attempts"] + 1
+            delay = min(self.retry_base * 2 ** (attempts - 1), 6 * 3600)
+            state = "failed" if attempts >= self.max_attempts else "pending"
+            self.store.mark(
+                lead_id,
+                state=state,
+                attempts=attempts,
+                next_attempt_at=time.time() + delay,
+                last_error=f"{type(exc).__name__}: {exc}"[:500],
+            )
+            print(f"[ERROR] lead {lead_id}: delivery attempt {attempts} failed ({exc})", file=sys.stderr)
+        finally:
+            with self._lock:
+                self._in_flight.discard(lead_id)
+            self._wake.set()
+
+
+# --------------------------------------------------------------------------- wsgi
+
+
+class LeadIntakeApp:
+    """WSGI callable mirroring contact.php's redirects."""
+
+    def __init__(self, store: LeadStore, dispatcher: Optional[MailDispatcher] = None):
+        self.store = store
+        self.dispatcher = dispatcher
+
+    def __call__(self, environ: dict, start_response: Callable) -> list[bytes]:
+        if environ.get("REQUEST_METHOD") != "POST":
+            return self._redirect(start_response, FALLBACK_REDIRECT)
+
+        try:
+            length = int(environ.get("CONTENT_LENGTH") or 0)
+        except ValueError:
+            length = 0
+        if length <= 0 or length > MAX_BODY_BYTES:
+            return self._redirect(start_response, INVALID_REDIRECT)
+        body = environ["wsgi.input"].read(length).decode("utf-8", "replace")
+        lead = parse_lead(parse_qs(body, keep_blank_values=True))
+        if lead is None:
+            return self._redirect(start_response, INVALID_REDIRECT)
+
+        try:
+            self.store.add(lead)
+        except (sqlite3.Error, TimeoutError) as exc:
+            print(f"[ERROR] lead not stored: {exc}", file=sys.stderr)
+            return self._redirect(start_response, ERROR_REDIRECT)
+        return self._redirect(start_response, SUCCESS_REDIRECT)
+
+    @staticmethod
+    def _redirect(start_response: Callable, location: str) -> list[bytes]:
+        start_response(
+            "303 See Other",
+            [("Location", location), ("Content-Length", "0"), ("Cache-Control", "no-store")],
+        )
+        return [b""]
+
+
+def create_app(
+    db_path: Path, *, mail_workers: int = 4, deliver: bool = True, analytics_dir: Optional[Path] = None
+) -> LeadIntakeApp:
+    dispatcher: Optional[MailDispatcher] = None
+    analytics = None
+    if analytics_dir is not None:
+        # NumPy is only needed when the analytics log is enabled.
+        from diagnostic_analytics import DiagnosticLog, encode
+
+        analytics = DiagnosticLog(analytics_dir)
+
+    def on_commit(committed: list[tuple[int, float, Lead]]) -> None:
+        if dispatcher is not None:
+            dispatcher.wake()
+        if analytics is not None:
+            # Runs on the writer thread: an exception escaping here would stop every later commit.
+            # The leads are stored either way; `diagnostic_analytics.py import` catches up.
+            try:
+                rows = [
+                    encode(DiagnosticAnswers.from_mapping(json.loads(lead.diagnostic)), received_at, lead_id)
+                    for lead_id, received_at, lead in committed
+                    if lead.diagnostic
+                ]
+                analytics.append(rows)
+            except Exception as exc:
+                print(f"[ERROR] analytics append failed: {exc!r}", file=sys.stderr)
+
+    store = LeadStore(db_path, on_commit=on_commit)
+    if deliver:
+        dispatcher = MailDispatcher(store, workers=mail_workers).start()
+    return LeadIntakeApp(store, dispatcher)
+
+
+_default_app: Optional[LeadIntakeApp] = None
+_default_lock = threading.Lock()
+
+
+def application(environ: dict, start_response: Callable) -> list[bytes]:
+    """Entry point for external WSGI servers, configured from LEAD_INTAKE_* variables."""
+    global _default_app
+    if _default_app is None:
+        with _default_lock:
+            if _default_app is None:
+                _default_app = create_app(
+                    Path(env_default("DB", str(DEFAULT_DB))),
+                    mail_workers=int(env_default("MAIL_WORKERS", "4")),
+                    analytics_dir=Path(env_default("ANALYTICS")) if env_default("ANALYTICS") else None,
+                )
+    return _default_app(environ, start_response)
+
+
+# --------------------------------------------------------------------------- cli
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Contact form intake: SQLite first, email in the background.")
+    parser.add_argument(
+        "--db",
+        type=Path,
+        default=Path(env_default("DB", str(DEFAULT_DB))),
+        help="SQLite database (default: leads.sqlite3 next to this script).",
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve = commands.add_parser("serve", help="Run the intake endpoint.")
+    serve.add_argument("--host", default=env_default("HOST", "127.0.0.1"), help="Bind address.")
+    serve.add_argument("--port", type=int, default=int(env_default("PORT", "8080")), help="Bind port.")
+    serve.add_argument(
+        "--mail-workers",
+        type=int,
+        default=int(env_default("MAIL_WORKERS", "4")),
+        help="Concurrent SMTP deliveries (default: 4).",
+    )
+    serve.add_argument("--no-delivery", action="store_true", help="Store leads only, send no email.")
+    serve.add_argument(
+        "--analytics",
+        type=Path,
+        default=env_default("ANALYTICS"),
+        help="Also append diagnostic answers to this diagnostic_analytics.py log (requires NumPy).",
+    )
+    serve.add_argument("--access-log", action="store_true", help="Log every request.")
+
+    commands.add_parser("status", help="Count leads per delivery state.")
+    commands.add_parser("requeue", help="Retry leads whose delivery failed.")
+    return parser
+
+
+def main(argv: list[str]) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.command == "serve":
+        app = create_app(
+            args.db,
+            mail_workers=args.mail_workers,
+            deliver=not args.no_delivery,
+            analytics_dir=Path(args.analytics) if args.analytics else None,
+        )
+        handler = WSGIRequestHandler if args.access_log else QuietHandler
+        with make_server(args.host, args.port, app, server_class=ThreadingWSGIServer, handler_class=handler) as httpd:
+            print(f"Lead intake on http://{args.host}:{args.port}/ (database {args.db})")
+            try:
+                httpd.serve_forever()
+            except KeyboardInterrupt:
+                pass
+        if app.dispatcher is not None:
+            app.dispatcher.stop()
+        app.store.close()
+        return 0
+
+    store = LeadStore(args.db)
+    if args.command == "requeue":
+        cursor = store.conn().execute(
+            "UPDATE leads SET state = 'pending', attempts = 0, next_attempt_at = ? WHERE state = 'failed'",
+            (time.time(),),
+        )
+        print(f"{cursor.rowcount} lead(s) requeued.")
+    else:
+        counts = store.counts()
+        for state in ("pending", "sending", "sent", "failed"):
+            print(f"{state:<8} {counts.get(state, 0)}")
+        oldest = store.conn().execute("SELECT MIN(received_at) FROM leads WHERE state = 'pending'").fetchone()[0]
+        if oldest is not None:
+            print(f"Oldest pending lead received {time.time() - oldest:.0f} s ago.")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
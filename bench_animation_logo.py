@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Benchmark the logo rotation animation built by ANIMATION_LOGO.py.
+
+Each rendering path is run over a matrix of logo sizes and frame counts.
+For every run the script records the wall time spent in each stage
+(load, rotate, convert, render, encode) and the resulting frames per second
+from an untraced pass. A second pass measures the peak memory traced by
+tracemalloc, and an optional third one runs under cProfile, so neither
+tracer inflates the timings. Everything is written to JSON so results can
+be compared from one commit to the next.
+
+Example:
+    $ python bench_animation_logo.py --sizes 128 256 512 --frames 36 120 \\
+        --paths matplotlib pil-gif --output animation_benchmark.json
+
+    $ python bench_animation_logo.py --compare previous.json animation_benchmark.json
+
+Use --profile-dir to dump one cProfile .prof file per run (readable with
+`python -m pstats` or snakeviz).
+"""
+
+from __future__ import annotations
+
+import argparse
+import cProfile
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Callable, Iterator, Optional
+
+from PIL import Image, ImageOps
+
+try:  # resource only exists on POSIX systems
+    import resource
+except ImportError:  # pragma: no cover - Windows
+    resource = None  # type: ignore[assignment]
+
+
+DEFAULT_IMAGE = Path(__file__).parent / "LOGO_CLN.png"
+DEFAULT_SIZES = (128, 256, 512)
+DEFAULT_FRAMES = (36, 120)
+STAGES = ("load", "rotate", "convert", "render", "encode")
+
+
+@dataclass
+class StageTimer:
+    """Accumulates wall time per stage."""
+
+    seconds: dict[str, float] = field(default_factory=lambda: dict.fromkeys(STAGES, 0.0))
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.seconds[name] += time.perf_counter() - start
+
+
+@dataclass
+class RunResult:
+    path: str
+    size: int
+    frames: int
+    output_bytes: int
+    total_seconds: float
+    frames_per_second: float
+    stage_seconds: dict[str, float]
+    tracemalloc_peak_bytes: int
+    profile_file: Optional[str] = None
+
+
+def _prepare_logo(image_path: Path, size: int, timer: StageTimer) -> Image.Image:
+    """Fit the logo in a size x size square, keeping its aspect ratio and padding the rest."""
+    with timer.stage("load"):
+        # Same as ANIMATION_LOGO.load_image, without importing that module (matplotlib, numpy).
+        img = Image.open(image_path)
+        img.load()
+        if img.size != (size, size):
+            fill = (0, 0, 0, 0) if img.mode == "RGBA" else "white"
+            img = ImageOps.pad(img, (size, size), Image.LANCZOS, color=fill)
+    return img
+
+
+def _angles(frames: int) -> list[float]:
+    return [360.0 * index / frames for index in range(frames)]
+
+
+def render_matplotlib(image_path: Path, size: int, frames: int, out_dir: Path, timer: StageTimer) -> Path:
+    """Mirror ANIMATION_LOGO.animate_logo: imshow + set_array, frames grabbed by a movie writer."""
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.animation as animation
+    import matplotlib.pyplot as plt
+    import numpy as np
+
+    img = _prepare_logo(image_path, size, timer)
+
+    with timer.stage("render"):
+        dpi = 100
+        fig, ax = plt.subplots(figsize=(size / dpi, size / dpi), dpi=dpi)
+        ax.set_aspect("equal")
+        img_np = np.asarray(img)
+        logo = ax.imshow(img_np, origin="upper")
+        ax.set_xlim(0, img_np.shape[1])
+        ax.set_ylim(img_np.shape[0], 0)
+
+    if animation.writers.is_available("ffmpeg"):
+        writer: animation.AbstractMovieWriter = animation.FFMpegWriter(fps=30)
+        save_path = out_dir / "logo_animation.mp4"
+    else:
+        writer = animation.PillowWriter(fps=30)
+        save_path = out_dir / "logo_animation.gif"
+
+    try:
+        with writer.saving(fig, str(save_path), dpi):
+            for angle in _angles(frames):
+                with timer.stage("rotate"):
+                    rotated_img = img.rotate(angle)
+                with timer.stage("convert"):
+                    logo.set_array(np.asarray(rotated_img))
+                with timer.stage("encode"):
+                    # grab_frame() draws the canvas then hands the buffer to the encoder.
+                    writer.grab_frame()
+    finally:
+        plt.close(fig)
+    return save_path
+
+
+def _rotate_frames(image_path: Path, size: int, frames: int, timer: StageTimer) -> list[Image.Image]:
+    img = _prepare_logo(image_path, size, timer)
+    rotated = []
+    for angle in _angles(frames):
+        with timer.stage("rotate"):
+            rotated.append(img.rotate(angle, resample=Image.BILINEAR, fillcolor="white"))
+    return rotated
+
+
+def render_pil_gif(image_path: Path, size: int, frames: int, out_dir: Path, timer: StageTimer) -> Path:
+    """PIL only: rotate, quantise to a palette and write an animated GIF."""
+    rotated = _rotate_frames(image_path, size, frames, timer)
+    with timer.stage("convert"):
+        if rotated[0].mode not in ("RGB", "L"):
+            # GIF has no alpha channel; quantize() only accepts RGB or L.
+            rotated = [frame.convert("RGB") for frame in rotated]
+        palette = rotated[0].quantize(colors=256)
+        converted = [frame.quantize(palette=palette, dither=Image.Dither.NONE) for frame in rotated]
+    save_path = out_dir / "logo_animation.gif"
+    with timer.stage("encode"):
+        converted[0].save(
+            save_path,
+            save_all=True,
+            append_images=converted[1:],
+            duration=round(1000 / 30),
+            loop=0,
+            optimize=False,
+        )
+    return save_path
+
+
+def render_pil_webp(image_path: Path, size: int, frames: int, out_dir: Path, timer: StageTimer) -> Path:
+    """PIL only: rotate and write an animated WebP (no palette conversion needed)."""
+    rotated = _rotate_frames(image_path, size, frames, timer)
+    save_path = out_dir / "logo_animation.webp"
+    with timer.stage("encode"):
+        rotated[0].save(
+            save_path,
+            save_all=True,
+            append_images=rotated[1:],
+            duration=round(1000 / 30),
+            loop=0,
+            quality=80,
+            method=4,
+        )
+    return save_path
+
+
+RENDERERS: dict[str, Callable[[Path, int, int, Path, StageTimer], Path]] = {
+    "matplotlib": render_matplotlib,
+    "pil-gif": render_pil_gif,
+    "pil-webp": render_pil_webp,
+}
+
+
+def _max_rss_bytes() -> Optional[int]:
+    """Peak RSS of the whole process (it never decreases, so it is reported once per report)."""
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS.
+    return rss if sys.platform == "darwin" else rss * 1024
+
+
+def _timed_pass(path: str, image_path: Path, size: int, frames: int) -> tuple[float, StageTimer, int]:
+    """Untraced run: wall time, per-stage timings and output size."""
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory(prefix="cln-bench-") as tmp:
+        start = time.perf_counter()
+        output = RENDERERS[path](image_path, size, frames, Path(tmp), timer)
+        total = time.perf_counter() - start
+        return total, timer, output.stat().st_size
+
+
+def _memory_pass(path: str, image_path: Path, size: int, frames: int) -> int:
+    """Run under tracemalloc and return the traced peak in bytes."""
+    with tempfile.TemporaryDirectory(prefix="cln-bench-") as tmp:
+        tracemalloc.start()
+        try:
+            RENDERERS[path](image_path, size, frames, Path(tmp), StageTimer())
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+    return peak
+
+
+def _profile_pass(path: str, image_path: Path, size: int, frames: int, profile_dir: Path) -> str:
+    profiler = cProfile.Profile()
+    with tempfile.TemporaryDirectory(prefix="cln-bench-") as tmp:
+        profiler.enable()
+        try:
+            RENDERERS[path](image_path, size, frames, Path(tmp), StageTimer())
+        finally:
+            profiler.disable()
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    profile_path = profile_dir / f"{path}_{size}px_{frames}f.prof"
+    profiler.dump_stats(str(profile_path))
+    return str(profile_path)
+
+
+def run_once(
+    path: str,
+    image_path: Path,
+    size: int,
+    frames: int,
+    profile_dir: Optional[Path] = None,
+    repeat: int = 1,
+) -> RunResult:
+    """Fastest of `repeat` untraced passes, then one tracemalloc pass and an optional cProfile pass.
+
+    A short untimed warm-up comes first, so one-off costs (importing
+    matplotlib, building its font cache) do not land in the first cell.
+    """
+    _timed_pass(path, image_path, size, min(frames, 2))
+    total, timer, output_bytes = min(
+        (_timed_pass(path, image_path, size, frames) for _ in range(max(1, repeat))),
+        key=lambda run: run[0],
+    )
+    peak = _memory_pass(path, image_path, size, frames)
+    profile_file = _profile_pass(path, image_path, size, frames, profile_dir) if profile_dir else None
+
+    return RunResult(
+        path=path,
+        size=size,
+        frames=frames,
+        output_bytes=output_bytes,
+        total_seconds=round(total, 6),
+        frames_per_second=round(frames / total, 2) if total else 0.0,
+        stage_seconds={name: round(value, 6) for name, value in timer.seconds.items()},
+        tracemalloc_peak_bytes=peak,
+        profile_file=profile_file,
+    )
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        completed = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=Path(__file__).parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return completed.stdout.strip() or None
+
+
+def _environment() -> dict[str, Optional[str]]:
+    import PIL
+
+    try:
+        import matplotlib
+
+        matplotlib_version: Optional[str] = matplotlib.__version__
+    except ImportError:
+        matplotlib_version = None
+
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "pillow": PIL.__version__,
+        "matplotlib": matplotlib_version,
+        "ffmpeg": shutil.which("ffmpeg"),
+        "cpu_count": str(os.cpu_count()),
+    }
+
+
+def _format_row(result: RunResult) -> str:
+    stages = " ".join(
+        f"{name}={result.stage_seconds[name] * 1000:.1f}ms" for name in STAGES if result.stage_seconds[name]
+    )
+    return (
+        f"{result.path:<11} {result.size:>5}px {result.frames:>4}f "
+        f"{result.total_seconds:>8.3f}s {result.frames_per_second:>8.1f} fps "
+        f"peak={result.tracemalloc_peak_bytes / 1_048_576:>7.1f}MiB  {stages}"
+    )
+
+
+def compare_reports(baseline_path: Path, candidate_path: Path) -> int:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))
+    candidate = json.loads(candidate_path.read_text(encoding="utf-8"))
+
+    def key(row: dict) -> tuple:
+        return row["path"], row["size"], row["frames"]
+
+    previous = {key(row): row for row in baseline["results"]}
+    print(f"Baseline {baseline.get('commit') or '?'} -> candidate {candidate.get('commit') or '?'}")
+    for row in candidate["results"]:
+        old = previous.get(key(row))
+        if not old:
+            print(f"{row['path']:<11} {row['size']:>5}px {row['frames']:>4}f  (new)")
+            continue
+        speedup = old["total_seconds"] / row["total_seconds"] if row["total_seconds"] else 0.0
+        memory = row["tracemalloc_peak_bytes"] - old["tracemalloc_peak_bytes"]
+        print(
+            f"{row['path']:<11} {row['size']:>5}px {row['frames']:>4}f "
+            f"{old['total_seconds']:.3f}s -> {row['total_seconds']:.3f}s (x{speedup:.2f}), "
+            f"peak {memory / 1_048_576:+.1f}MiB"
+        )
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Benchmark the logo rotation animation.")
+    parser.add_argument("--image", type=Path, default=DEFAULT_IMAGE, help="Logo to animate.")
+    parser.add_argument(
+        "--paths",
+        nargs="+",
+        choices=sorted(RENDERERS),
+        default=sorted(RENDERERS),
+        help="Rendering/encoding paths to benchmark (default: all).",
+    )
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(DEFAULT_SIZES), help="Logo sizes in pixels.")
+    parser.add_argument("--frames", nargs="+", type=int, default=list(DEFAULT_FRAMES), help="Frame counts.")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per combination; the fastest is kept.")
+    parser.add_argument(
+        "--output",
+        type=Path,
+        default=Path("animation_benchmark.json"),
+        help="JSON report path (default: animation_benchmark.json).",
+    )
+    parser.add_argument("--profile-dir", type=Path, help="Dump one cProfile .prof file per run in this folder.")
+    parser.add_argument(
+        "--compare",
+        nargs=2,
+        type=Path,
+        metavar=("BASELINE", "CANDIDATE"),
+        help="Compare two JSON reports instead of running the benchmark.",
+    )
+    return parser
+
+
+def main(argv: list[str]) -> int:
+    args = build_parser().parse_args(argv)
+
+    if args.compare:
+        return compare_reports(*args.compare)
+
+    if not args.image.exists():
+        raise SystemExit(f"Image not found: {args.image}")
+    if any(size <= 0 for size in args.sizes) or any(count <= 0 for count in args.frames):
+        raise SystemExit("--sizes and --frames must be positive integers.")
+
+    results: list[RunResult] = []
+    for path in args.paths:
+        for size in args.sizes:
+            for frames in args.frames:
+                try:
+                    result = run_once(path, args.image, size, frames, args.profile_dir, args.repeat)
+                except (ImportError, KeyError, OSError) as exc:
+                    print(f"[WARNING] {path} skipped: {exc}", file=sys.stderr)
+                    continue
+                results.append(result)
+                print(_format_row(result), flush=True)
+
+    report = {
+        "commit": _git_commit(),
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "image": str(args.image),
+        "environment": _environment(),
+        "max_rss_bytes": _max_rss_bytes(),
+        "results": [asdict(result) for result in results],
+    }
+    args.output.write_text(json.dumps(report, indent=2) + "\n", encoding="utf-8")
+    print(f"Report written to {args.output}")
+    return 0 if results else 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
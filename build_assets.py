@@ -0,0 +1,511 @@
+#!/usr/bin/env python3
+"""
+Asset stage for the CLN site build: minify, fingerprint, precompress.
+
+- styles.css and other stylesheets/scripts are minified, then every static
+  asset (CSS, JS, images) is renamed with a content hash of its final bytes:
+  styles.css -> styles.3f9a0c1b2d.css.
+- Every reference to a renamed asset (src, href, srcset, CSS url()) is
+  rewritten in the pages and in the standalone HTML documents, which are
+  minified along with their inline <script> and <style> blocks. Assets
+  nothing references any more (photos the image stage replaced by img/
+  variants everywhere) are left out of dist/.
+- After the build, text files get a gzip sibling (styles.<hash>.css.gz)
+  and dist/.htaccess is generated so Apache/LiteSpeed serves the .gz
+  variants and marks fingerprinted files as immutable for a year. HTML
+  and PHP stay "no-cache", so a new deploy is picked up immediately
+  while repeat visits never revalidate CSS, JS or images.
+
+The minifiers only remove what is provably insignificant (comments,
+indentation, whitespace around punctuation); line breaks are kept in
+JavaScript so automatic semicolon insertion is unaffected.
+
+Example:
+    $ python build_site.py --images --assets
+"""
+
+from __future__ import annotations
+
+import gzip
+import hashlib
+import re
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Sequence
+
+from build_site import (
+    DEFAULT_CACHE,
+    SITE_ROOT,
+    InputIndex,
+    PageTransform,
+    _write_atomic,
+    discover_pages,
+    discover_static,
+    load_cache,
+    render_page,
+)
+
+
+ASSETS_VERSION = "1"
+FINGERPRINT_LENGTH = 10
+FINGERPRINT_EXTENSIONS = {".css", ".js", ".png", ".jpg", ".jpeg", ".webp", ".svg", ".ico"}
+MINIFY_EXTENSIONS = {".css", ".js", ".html"}
+COMPRESS_EXTENSIONS = {".html", ".css", ".js", ".svg", ".json", ".txt", ".xml"}
+IMMUTABLE_PATTERN = r"\.[0-9a-f]{%d}\.(css|js|png|jpe?g|webp|svg|ico)$" % FINGERPRINT_LENGTH
+
+HTACCESS = f"""# Generated by build_assets.py; edit the generator, not this file.
+AddDefaultCharset UTF-8
+
+# Dotfiles (the deployment manifest, upload temporaries) are never served.
+<FilesMatch "^\\.">
+  <IfModule mod_authz_core.c>
+    Require all denied
+  </IfModule>
+  <IfModule !mod_authz_core.c>
+    Order allow,deny
+    Deny from all
+  </IfModule>
+</FilesMatch>
+
+<IfModule mod_headers.c>
+  <FilesMatch "{IMMUTABLE_PATTERN}">
+    Header set Cache-Control "public, max-age=31536000, immutable"
+  </FilesMatch>
+  <FilesMatch "\\.[0-9a-f]{{{FINGERPRINT_LENGTH}}}\\.(css|js|svg)\\.gz$">
+    Header set Cache-Control "public, max-age=31536000, immutable"
+  </FilesMatch>
+  <FilesMatch "\\.(html|php)(\\.gz)?$">
+    Header set Cache-Control "no-cache"
+  </FilesMatch>
+</IfModule>
+
+# Serve the precompressed .gz sibling when the client accepts gzip.
+<IfModule mod_rewrite.c>
+  RewriteEngine On
+  RewriteCond %{{HTTP:Accept-Encoding}} gzip
+  RewriteCond %{{REQUEST_FILENAME}}.gz -f
+  RewriteRule ^(.*\\.(html|css|js|svg))$ $1.gz [L]
+  RewriteCond %{{HTTP:Accept-Encoding}} gzip
+  RewriteCond %{{REQUEST_FILENAME}}index.html.gz -f
+  RewriteRule ^(.*/)?$ $1index.html.gz [L]
+  RewriteRule \\.html\\.gz$ - [T=text/html,E=no-gzip:1]
+  RewriteRule \\.css\\.gz$ - [T=text/css,E=no-gzip:1]
+  RewriteRule \\.js\\.gz$ - [T=text/javascript,E=no-gzip:1]
+  RewriteRule \\.svg\\.gz$ - [T=image/svg+xml,E=no-gzip:1]
+</IfModule>
+
+<IfModule mod_headers.c>
+  <FilesMatch "\\.(html|css|js|svg)\\.gz$">
+    Header set Content-Encoding gzip
+    Header append Vary Accept-Encoding
+  </FilesMatch>
+</IfModule>
+"""
+
+
+# --------------------------------------------------------------------------- minifiers
+
+CSS_COMMENT_RE = re.compile(r"/\*.*?\*/", re.DOTALL)
+CSS_STRING_RE = re.compile(r"""("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')""")
+CSS_SPACE_RE = re.compile(r"\s+")
+CSS_PUNCTUATION_RE = re.compile(r"\s*([{};,>])\s*")
+CSS_COLON_RE = re.compile(r":\s+")
+CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+
+
+def minify_css(css: str) -> str:
+    """Strip comments and insignificant whitespace, leaving strings untouched."""
+    parts = CSS_STRING_RE.split(css)
+    out = []
+    for index, part in enumerate(parts):
+        if index % 2:
+            out.append(part)
+            continue
+        part = CSS_COMMENT_RE.sub("", part)
+        part = CSS_SPACE_RE.sub(" ", part)
+        part = CSS_PUNCTUATION_RE.sub(r"\1", part)
+        part = CSS_COLON_RE.sub(":", part)
+        out.append(part.replace(";}", "}"))
+    return "".join(out).strip()
+
+
+JS_IDENTIFIER = re.compile(r"[\w$\\]")
+# Characters after which a "/" starts a regular expression literal rather than a division.
+JS_REGEX_PRECEDERS = set("(,=:[!&|?{};+-*%<>~^")
+JS_REGEX_KEYWORDS = {"return", "typeof", "case", "do", "else", "in", "of", "new", "delete", "void", "throw", "yield"}
+
+
+def _skip_quoted(src: str, start: int) -> int:
+    """Return the index just past the string or template literal opening at src[start]."""
+    quote = src[start]
+    i = start + 1
+    while i < len(src):
+        char = src[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == quote:
+            return i + 1
+        if quote == "`" and src.startswith("${", i):
+            i = _skip_braced(src, i + 2)
+            continue
+        i += 1
+    return len(src)
+
+
+def _skip_braced(src: str, start: int) -> int:
+    """Skip a template ${...} expression, honouring nested strings and braces."""
+    depth = 1
+    i = start
+    while i < len(src) and depth:
+        char = src[i]
+        if char in "'\"`":
+            i = _skip_quoted(src, i)
+            continue
+        if char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+        i += 1
+    return i
+
+
+def _skip_regex(src: str, start: int) -> int:
+    i = start + 1
+    in_class = False
+    while i < len(src):
+        char = src[i]
+        if char == "\\":
+            i += 2
+            continue
+        if char == "\n":
+            return i
+        if char == "[":
+            in_class = True
+        elif char == "]":
+            in_class = False
+        elif char == "/" and not in_class:
+            i += 1
+            while i < len(src) and JS_IDENTIFIER.match(src[i]):
+                i += 1
+            return i
+        i += 1
+    return i
+
+
+def _needs_space(previous: str, following: str) -> bool:
+    if JS_IDENTIFIER.match(previous) and JS_IDENTIFIER.match(following):
+        return True
+    # Keep "a - -b", "a + +b" and "a / /re/" unambiguous.
+    return previous == following and previous in "+-/"
+
+
+def minify_js(src: str) -> str:
+    """Remove comments and indentation; strings, templates and regex literals are copied verbatim."""
+    out: list[str] = []
+    pending_space = False
+    pending_newline = False
+    last_word = ""
+    i = 0
+
+    def emit(chunk: str) -> None:
+        nonlocal pending_space, pending_newline
+        if out and (pending_newline or pending_space):
+            previous = out[-1][-1]
+            if pending_newline:
+                out.append("\n")
+            elif _needs_space(previous, chunk[0]):
+                out.append(" ")
+        pending_space = pending_newline = False
+        out.append(chunk)
+
+    while i < len(src):
+        char = src[i]
+        if char in " \t\r":
+            pending_space = True
+            i += 1
+        elif char == "\n":
+            pending_newline = True
+            i += 1
+        elif src.startswith("//", i):
+            end = src.find("\n", i)
+            i = len(src) if end == -1 else end
+        elif src.startswith("/*", i):
+            end = src.find("*/", i + 2)
+            i = len(src) if end == -1 else end + 2
+            pending_space = True
+        elif char in "'\"`":
+            end = _skip_quoted(src, i)
+            emit(src[i:end])
+            last_word = ""
+            i = end
+        elif char == "/":
+            previous = out[-1][-1] if out else ""
+            if not previous or previous in JS_REGEX_PRECEDERS or last_word in JS_REGEX_KEYWORDS:
+                end = _skip_regex(src, i)
+                emit(src[i:end])
+                i = end
+            else:
+                emit(char)
+                i += 1
+            last_word = ""
+        elif JS_IDENTIFIER.match(char):
+            end = i
+            while end < len(src) and JS_IDENTIFIER.match(src[end]):
+                end += 1
+            last_word = src[i:end]
+            emit(last_word)
+            i = end
+        else:
+            emit(char)
+            last_word = ""
+            i += 1
+    return "".join(out).strip()
+
+
+HTML_RAW_BLOCK_RE = re.compile(r"(<(pre|textarea|script|style)\b[^>]*>)(.*?)(</\2\s*>)", re.DOTALL | re.IGNORECASE)
+HTML_COMMENT_RE = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+HTML_BREAK_RE = re.compile(r"[ \t]*\n\s*")
+
+
+def minify_html(html: str) -> str:
+    """Drop comments and indentation. Each whitespace run containing a line break becomes one
+    line break, which renders exactly like the original run."""
+    out = []
+    last = 0
+    for match in HTML_RAW_BLOCK_RE.finditer(html):
+        out.append(_minify_markup(html[last : match.start()]))
+        opening, tag, body, closing = match.group(1), match.group(2).lower(), match.group(3), match.group(4)
+        if tag == "script" and "src=" not in opening.lower():
+            body = minify_js(body)
+        elif tag == "style":
+            body = minify_css(body)
+        out.append(f"{_minify_markup(opening)}{body}{closing}")
+        last = match.end()
+    out.append(_minify_markup(html[last:]))
+    return "".join(out).strip() + "\n"
+
+
+def _minify_markup(markup: str) -> str:
+    markup = HTML_COMMENT_RE.sub("", markup)
+    return HTML_BREAK_RE.sub("\n", markup)
+
+
+# --------------------------------------------------------------------------- fingerprinting
+
+REFERENCE_ATTR_RE = re.compile(r"""\b(src|href|srcset|poster)=(["'])(.*?)\2""", re.IGNORECASE | re.DOTALL)
+
+
+def fingerprinted_name(rel: str, data: bytes) -> str:
+    path = Path(rel)
+    digest = hashlib.sha256(data).hexdigest()[:FINGERPRINT_LENGTH]
+    return str(path.with_name(f"{path.stem}.{digest}{path.suffix}"))
+
+
+def _rewrite_url(url: str, mapping: dict[str, str]) -> str:
+    for separator in ("#", "?"):
+        if separator in url:
+            base, rest = url.split(separator, 1)
+            return _rewrite_url(base, mapping) + separator + rest
+    return mapping.get(url, url)
+
+
+def rewrite_references(html: str, mapping: dict[str, str]) -> str:
+    def replace(match: re.Match[str]) -> str:
+        attribute, quote, value = match.groups()
+        if attribute.lower() == "srcset":
+            candidates = []
+            for candidate in value.split(","):
+                parts = candidate.strip().split(maxsplit=1)
+                if parts:
+                    parts[0] = _rewrite_url(parts[0], mapping)
+                candidates.append(" ".join(parts))
+            value = ", ".join(candidates)
+        else:
+            value = _rewrite_url(value.strip(), mapping)
+        return f"{attribute}={quote}{value}{quote}"
+
+    html = REFERENCE_ATTR_RE.sub(replace, html)
+    return rewrite_css_urls(html, mapping)
+
+
+def rewrite_css_urls(css: str, mapping: dict[str, str]) -> str:
+    return CSS_URL_RE.sub(lambda m: f"url({m.group(1)}{_rewrite_url(m.group(2), mapping)}{m.group(1)})", css)
+
+
+def _strip_url(url: str) -> str:
+    return url.split("#", 1)[0].split("?", 1)[0]
+
+
+def referenced_urls(text: str) -> set[str]:
+    """Every URL a document points at through src/href/srcset/poster or CSS url()."""
+    urls = set()
+    for attribute, _, value in REFERENCE_ATTR_RE.findall(text):
+        if attribute.lower() == "srcset":
+            urls.update(_strip_url(candidate.split()[0]) for candidate in value.split(",") if candidate.strip())
+        else:
+            urls.add(_strip_url(value.strip()))
+    urls.update(_strip_url(match.group(2)) for match in CSS_URL_RE.finditer(text))
+    return urls
+
+
+def _find_references(root: Path, page_transforms: Sequence[PageTransform]) -> set[str]:
+    references: set[str] = set()
+    for page_rel in discover_pages(root):
+        references |= referenced_urls(render_page(root, page_rel, page_transforms).decode("utf-8"))
+    for rel in discover_static(root):
+        suffix = Path(rel).suffix.lower()
+        if suffix in {".html", ".css"}:
+            references |= referenced_urls((root / rel).read_text(encoding="utf-8"))
+        elif suffix in {".js", ".php"}:
+            # No markup to parse: any asset name appearing in the source counts.
+            text = (root / rel).read_text(encoding="utf-8")
+            references.update(name for name in discover_static(root) if name in text)
+    return references
+
+
+@dataclass
+class AssetPlan:
+    """Final bytes and names of the fingerprinted root assets, computed before the build."""
+
+    mapping: dict[str, str] = field(default_factory=dict)
+    contents: dict[str, bytes] = field(default_factory=dict)
+    unreferenced: set[str] = field(default_factory=set)
+    key: str = ""
+
+
+def plan_assets(
+    root: Path = SITE_ROOT,
+    cache_path: Path = DEFAULT_CACHE,
+    page_transforms: Sequence[PageTransform] = (),
+) -> AssetPlan:
+    """Plan the asset stage.
+
+    ``page_transforms`` are the transforms that run before this stage and
+    may drop references (the image stage); an asset referenced by no page,
+    standalone document, stylesheet or script once they have run is left out.
+    """
+    plan = AssetPlan()
+    index = InputIndex(root, load_cache(cache_path).get("inputs", {}))
+    assets = [rel for rel in discover_static(root) if Path(rel).suffix.lower() in FINGERPRINT_EXTENSIONS]
+    # Stylesheets last: their url() references must point at already fingerprinted files.
+    assets.sort(key=lambda rel: (Path(rel).suffix.lower() == ".css", rel))
+
+    for rel in assets:
+        suffix = Path(rel).suffix.lower()
+        if suffix == ".css":
+            text = (root / rel).read_text(encoding="utf-8")
+            data = minify_css(rewrite_css_urls(text, plan.mapping)).encode("utf-8")
+            plan.contents[rel] = data
+            plan.mapping[rel] = fingerprinted_name(rel, data)
+        elif suffix == ".js":
+            data = minify_js((root / rel).read_text(encoding="utf-8")).encode("utf-8")
+            plan.contents[rel] = data
+            plan.mapping[rel] = fingerprinted_name(rel, data)
+        else:
+            path = Path(rel)
+            digest = index.digest(rel)[:FINGERPRINT_LENGTH]
+            plan.mapping[rel] = str(path.with_name(f"{path.stem}.{digest}{path.suffix}"))
+
+    references = _find_references(root, page_transforms)
+    plan.unreferenced = {rel for rel in plan.mapping if rel not in references}
+    payload = "\n".join(f"{source}\0{target}" for source, target in sorted(plan.mapping.items()))
+    plan.key = hashlib.sha256(f"{ASSETS_VERSION}\n{payload}".encode()).hexdigest()
+    return plan
+
+
+class FingerprintedAssets:
+    """Static transform: renames root assets and minifies CSS/JS/HTML copied from the root."""
+
+    def __init__(self, plan: AssetPlan):
+        self.plan = plan
+        self.key = plan.key
+
+    def output_name(self, rel: str) -> Optional[str]:
+        if rel in self.plan.unreferenced:
+            return None
+        return self.plan.mapping.get(rel, rel)
+
+    def __call__(self, rel: str, data: bytes) -> bytes:
+        if rel in self.plan.contents:
+            return self.plan.contents[rel]
+        if Path(rel).suffix.lower() == ".html":
+            html = rewrite_references(data.decode("utf-8"), self.plan.mapping)
+            return minify_html(html).encode("utf-8")
+        return data
+
+
+class MinifiedPages:
+    """Page transform: points references at fingerprinted assets, then minifies the page."""
+
+    def __init__(self, plan: AssetPlan):
+        self.plan = plan
+        self.key = plan.key
+
+    def __call__(self, html: str, page_name: str) -> str:
+        return minify_html(rewrite_references(html, self.plan.mapping))
+
+
+# --------------------------------------------------------------------------- post-build
+
+
+@dataclass
+class CompressionReport:
+    written: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    original_bytes: int = 0
+    compressed_bytes: int = 0
+
+    def summary(self) -> str:
+        ratio = self.compressed_bytes / self.original_bytes if self.original_bytes else 0.0
+        return (
+            f"gzip: {self.written} written, {self.unchanged} up to date, {self.removed} removed "
+            f"({self.original_bytes} -> {self.compressed_bytes} bytes, {ratio:.0%})"
+        )
+
+
+def precompress(dist: Path) -> CompressionReport:
+    """Write a .gz sibling next to every compressible file that is worth compressing."""
+    report = CompressionReport()
+    for path in sorted(dist.rglob("*")):
+        if not path.is_file():
+            continue
+        if path.suffix == ".gz":
+            if not path.with_suffix("").exists():
+                path.unlink()
+                report.removed += 1
+            continue
+        if path.suffix.lower() not in COMPRESS_EXTENSIONS:
+            continue
+        target = path.with_name(path.name + ".gz")
+        data = path.read_bytes()
+        try:
+            if target.stat().st_mtime_ns >= path.stat().st_mtime_ns:
+                report.unchanged += 1
+                report.original_bytes += len(data)
+                report.compressed_bytes += target.stat().st_size
+                continue
+        except FileNotFoundError:
+            pass
+        # mtime=0 keeps the archive reproducible.
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+        report.original_bytes += len(data)
+        if len(compressed) >= len(data):
+            target.unlink(missing_ok=True)
+            report.compressed_bytes += len(data)
+            continue
+        _write_atomic(target, compressed)
+        report.written += 1
+        report.compressed_bytes += len(compressed)
+    return report
+
+
+def write_htaccess(dist: Path) -> Optional[Path]:
+    """Generate dist/.htaccess; returns the path when its content changed."""
+    path = dist / ".htaccess"
+    data = HTACCESS.encode("utf-8")
+    if path.exists() and path.read_bytes() == data:
+        return None
+    _write_atomic(path, data)
+    return path
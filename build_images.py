@@ -0,0 +1,404 @@
+#!/usr/bin/env python3
+"""
+Responsive image stage for the CLN site build.
+
+Every local raster image referenced by an <img> tag in pages/ or partials/
+is resized to several widths and encoded twice: WebP, plus a progressive
+JPEG fallback (PNG when the source has transparency). Encoding runs in a
+process pool and each variant is cached in .build-cache/images/ under a
+key derived from the source SHA-256 and the encoding parameters, so an
+unchanged image is never re-encoded. Variants are published in dist/img/
+with that key in their name (logo-480w.<key>.webp).
+
+The returned page transform rewrites each matching <img> into a <picture>
+with a WebP <source>, srcset/sizes, intrinsic width/height and
+loading="lazy" for images below the fold (anything after the first
+<section> of <main>). Per-tag overrides:
+
+    sizes="42px"             kept as-is instead of DEFAULT_SIZES
+    data-widths="42,84,126"  widths to generate for this tag
+    loading="eager"          never made lazy
+
+Example:
+    $ python build_site.py --images
+    $ python build_images.py --workers 4      # images only, no page rebuild
+"""
+
+from __future__ import annotations
+
+import argparse
+import filecmp
+import hashlib
+import json
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+import PIL
+from PIL import Image
+
+from build_site import (
+    DEFAULT_DIST,
+    PAGES_DIRNAME,
+    PARTIALS_DIRNAME,
+    SITE_ROOT,
+    InputIndex,
+    _write_atomic,
+)
+
+
+PIPELINE_VERSION = "1"
+OUTPUT_DIRNAME = "img"
+DEFAULT_CACHE_DIR = SITE_ROOT / ".build-cache" / "images"
+DEFAULT_WIDTHS = (480, 768, 1200, 1600)
+DEFAULT_SIZES = "(max-width: 720px) 100vw, 540px"
+# Width used for the plain src attribute seen by browsers without srcset support.
+FALLBACK_WIDTH = 1200
+WEBP_QUALITY = 78
+JPEG_QUALITY = 80
+SOURCE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+IMG_TAG_RE = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+ATTR_RE = re.compile(r'([\w:-]+)(?:\s*=\s*"([^"]*)")?')
+# EXIF orientations that swap width and height.
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+
+@dataclass(frozen=True)
+class VariantJob:
+    source: Path
+    target: Path
+    width: int
+    height: int
+    fmt: str
+
+
+@dataclass
+class ImageInfo:
+    name: str
+    width: int
+    height: int
+    fallback_format: str
+    # format -> width -> path relative to dist/
+    variants: dict[str, dict[int, str]] = field(default_factory=dict)
+
+    def scaled_height(self, width: int) -> int:
+        return max(1, round(self.height * width / self.width))
+
+
+@dataclass
+class ImageReport:
+    images: int = 0
+    encoded: int = 0
+    cached: int = 0
+    missing: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{self.images} image(s): {self.encoded} variant(s) encoded, {self.cached} from cache, "
+            f"{len(self.removed)} stale removed in {self.seconds * 1000:.1f} ms"
+        )
+
+
+def _parse_attrs(tag: str) -> dict[str, Optional[str]]:
+    inner = re.sub(r"^<img\b", "", tag, flags=re.IGNORECASE).rstrip(">").rstrip("/")
+    attrs: dict[str, Optional[str]] = {}
+    for match in ATTR_RE.finditer(inner):
+        attrs[match.group(1).lower()] = match.group(2)
+    return attrs
+
+
+def _requested_widths(attrs: dict[str, Optional[str]]) -> tuple[int, ...]:
+    raw = attrs.get("data-widths")
+    if not raw:
+        return DEFAULT_WIDTHS
+    widths = sorted({int(part) for part in raw.split(",") if part.strip().isdigit() and int(part) > 0})
+    return tuple(widths) or DEFAULT_WIDTHS
+
+
+def _is_local_source(src: Optional[str]) -> bool:
+    if not src or "://" in src or src.startswith(("//", "data:", "/")):
+        return False
+    return Path(src).suffix.lower() in SOURCE_EXTENSIONS
+
+
+def collect_references(root: Path) -> dict[str, set[int]]:
+    """Map each local image referenced from pages/partials to the widths requested for it."""
+    references: dict[str, set[int]] = {}
+    for folder in (PAGES_DIRNAME, PARTIALS_DIRNAME):
+        for path in sorted((root / folder).glob("*.html")):
+            for tag in IMG_TAG_RE.findall(path.read_text(encoding="utf-8")):
+                attrs = _parse_attrs(tag)
+                src = attrs.get("src")
+                if _is_local_source(src):
+                    references.setdefault(src, set()).update(_requested_widths(attrs))
+    return references
+
+
+def _source_dimensions(path: Path) -> tuple[int, int, bool]:
+    with Image.open(path) as img:
+        width, height = img.size
+        if img.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+            width, height = height, width
+        has_alpha = img.mode in {"RGBA", "LA", "PA"} or "transparency" in img.info
+    return width, height, has_alpha
+
+
+def _effective_widths(requested: set[int], source_width: int) -> list[int]:
+    widths = sorted(width for width in requested if width <= source_width)
+    return widths or [source_width]
+
+
+def _variant_key(source_hash: str, width: int, fmt: str) -> str:
+    params = f"{PIPELINE_VERSION}|{PIL.__version__}|{width}|{fmt}|{WEBP_QUALITY}|{JPEG_QUALITY}"
+    return hashlib.sha256(f"{source_hash}|{params}".encode()).hexdigest()[:32]
+
+
+def encode_variant(job: VariantJob) -> str:
+    """Resize and encode one variant into the cache (runs in a worker process)."""
+    from PIL import ImageOps
+
+    with Image.open(job.source) as img:
+        if img.format == "JPEG":
+            # Let libjpeg decode at a reduced scale: much faster for large photos.
+            img.draft("RGB", (job.width, job.height))
+        img = ImageOps.exif_transpose(img)
+        if job.fmt != "png" and img.mode not in {"RGB", "RGBA"}:
+            img = img.convert("RGBA" if "transparency" in img.info else "RGB")
+        resized = img.resize((job.width, job.height), Image.LANCZOS, reducing_gap=3.0)
+
+    buffer_path = job.target.with_name(f".{job.target.name}.{os.getpid()}.tmp")
+    if job.fmt == "webp":
+        resized.save(buffer_path, format="WEBP", quality=WEBP_QUALITY, method=6)
+    elif job.fmt == "jpg":
+        resized.convert("RGB").save(
+            buffer_path, format="JPEG", quality=JPEG_QUALITY, progressive=True, optimize=True
+        )
+    else:
+        resized.save(buffer_path, format="PNG", optimize=True)
+    os.replace(buffer_path, job.target)
+    return str(job.target)
+
+
+def _variant_name(src: str, width: int, fmt: str, key: str) -> str:
+    # The cache key changes with the source bytes and encoding settings, so it doubles
+    # as a content fingerprint and lets the variant be cached as immutable.
+    return f"{OUTPUT_DIRNAME}/{Path(src).stem}-{width}w.{key[:10]}.{fmt}"
+
+
+def _publish(cache_file: Path, target: Path) -> None:
+    # Compare bytes, not sizes: a variant edited or corrupted in place keeps its size.
+    try:
+        if filecmp.cmp(cache_file, target, shallow=False):
+            return
+    except FileNotFoundError:
+        pass
+    _write_atomic(target, cache_file.read_bytes())
+
+
+def process_images(
+    root: Path = SITE_ROOT,
+    dist: Path = DEFAULT_DIST,
+    cache_dir: Path = DEFAULT_CACHE_DIR,
+    *,
+    workers: Optional[int] = None,
+) -> tuple[dict[str, ImageInfo], ImageReport]:
+    start = time.perf_counter()
+    report = ImageReport()
+    manifest_path = cache_dir.parent / "images.json"
+    try:
+        manifest = json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        manifest = {}
+    if manifest.get("version") != PIPELINE_VERSION:
+        manifest = {}
+
+    index = InputIndex(root, manifest.get("inputs", {}))
+    infos: dict[str, ImageInfo] = {}
+    jobs: list[VariantJob] = []
+    publish: list[tuple[Path, Path]] = []
+
+    for src, requested in sorted(collect_references(root).items()):
+        source = root / src
+        if not source.is_file():
+            report.missing.append(src)
+            continue
+        entry = index.entry(src)
+        if "dimensions" not in entry:
+            width, height, has_alpha = _source_dimensions(source)
+            entry["dimensions"] = [width, height, has_alpha]
+        width, height, has_alpha = entry["dimensions"]
+        info = ImageInfo(src, width, height, "png" if has_alpha else "jpg")
+        for fmt in ("webp", info.fallback_format):
+            for variant_width in _effective_widths(requested, width):
+                key = _variant_key(entry["sha256"], variant_width, fmt)
+                cache_file = cache_dir / f"{key}.{fmt}"
+                if cache_file.is_file():
+                    report.cached += 1
+                else:
+                    jobs.append(
+                        VariantJob(source, cache_file, variant_width, info.scaled_height(variant_width), fmt)
+                    )
+                rel = _variant_name(src, variant_width, fmt, key)
+                info.variants.setdefault(fmt, {})[variant_width] = rel
+                publish.append((cache_file, dist / rel))
+        infos[src] = info
+    report.images = len(infos)
+
+    if jobs:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        if len(jobs) == 1 or workers == 1:
+            for job in jobs:
+                encode_variant(job)
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                # Largest images first so the pool is not left waiting on one big encode.
+                ordered = sorted(jobs, key=lambda job: job.width * job.height, reverse=True)
+                list(pool.map(encode_variant, ordered))
+        report.encoded = len(jobs)
+
+    for cache_file, target in publish:
+        _publish(cache_file, target)
+
+    outputs = sorted(str(target.relative_to(dist)) for _, target in publish)
+    if manifest.get("dist") == str(dist.resolve()):
+        for stale in sorted(set(manifest.get("outputs", [])) - set(outputs)):
+            (dist / stale).unlink(missing_ok=True)
+            report.removed.append(stale)
+
+    _write_atomic(
+        manifest_path,
+        (
+            json.dumps(
+                {
+                    "version": PIPELINE_VERSION,
+                    "dist": str(dist.resolve()),
+                    "inputs": index.entries,
+                    "outputs": outputs,
+                },
+                indent=1,
+                sort_keys=True,
+            )
+            + "\n"
+        ).encode("utf-8"),
+    )
+    report.seconds = time.perf_counter() - start
+    return infos, report
+
+
+def _srcset(variants: dict[int, str], widths: list[int]) -> str:
+    return ", ".join(f"{variants[width]} {width}w" for width in widths)
+
+
+def _format_attrs(attrs: list[tuple[str, Optional[str]]]) -> str:
+    return " ".join(name if value is None else f'{name}="{value}"' for name, value in attrs)
+
+
+def _fold_offset(page: str) -> int:
+    """Offset of the end of the first <section> in <main>; images after it are below the fold."""
+    main = page.find("<main")
+    if main == -1:
+        return len(page)
+    end = page.find("</section>", main)
+    return len(page) if end == -1 else end
+
+
+class ResponsiveImages:
+    """Page transform replacing <img> tags by responsive <picture> elements."""
+
+    def __init__(self, images: dict[str, ImageInfo]):
+        self.images = images
+        payload = json.dumps(
+            {
+                "version": PIPELINE_VERSION,
+                "sizes": DEFAULT_SIZES,
+                "images": {
+                    name: [info.width, info.height, info.fallback_format, info.variants]
+                    for name, info in sorted(images.items())
+                },
+            },
+            sort_keys=True,
+        )
+        self.key = hashlib.sha256(payload.encode()).hexdigest()
+
+    def __call__(self, page: str, page_name: str) -> str:
+        fold = _fold_offset(page)
+        pieces: list[str] = []
+        last = 0
+        for match in IMG_TAG_RE.finditer(page):
+            inside_picture = page.rfind("<picture", 0, match.start()) > page.rfind("</picture>", 0, match.start())
+            replacement = None if inside_picture else self._rewrite(match.group(0), match.start() > fold)
+            if replacement is None:
+                continue
+            pieces.append(page[last : match.start()])
+            pieces.append(replacement)
+            last = match.end()
+        pieces.append(page[last:])
+        return "".join(pieces)
+
+    def _rewrite(self, tag: str, below_fold: bool) -> Optional[str]:
+        attrs = _parse_attrs(tag)
+        info = self.images.get(attrs.get("src") or "")
+        if info is None or "srcset" in attrs:
+            return None
+
+        available = sorted(info.variants[info.fallback_format])
+        requested = _requested_widths(attrs)
+        widths = [width for width in available if width in requested] or available
+        fallback_candidates = [width for width in widths if width <= FALLBACK_WIDTH]
+        fallback_width = fallback_candidates[-1] if fallback_candidates else widths[0]
+        fallback = info.variants[info.fallback_format]
+        sizes = attrs.get("sizes") or DEFAULT_SIZES
+        loading = attrs.get("loading") or ("lazy" if below_fold else None)
+
+        img_attrs: list[tuple[str, Optional[str]]] = [
+            ("src", fallback[fallback_width]),
+            ("srcset", _srcset(fallback, widths)),
+            ("sizes", sizes),
+            ("width", str(fallback_width)),
+            ("height", str(info.scaled_height(fallback_width))),
+        ]
+        skipped = {"src", "srcset", "sizes", "width", "height", "loading", "decoding", "data-widths"}
+        img_attrs.extend((name, value) for name, value in attrs.items() if name not in skipped)
+        if loading:
+            img_attrs.append(("loading", loading))
+        img_attrs.append(("decoding", "async"))
+
+        source = (
+            f'<source type="image/webp" srcset="{_srcset(info.variants["webp"], widths)}" '
+            f'sizes="{sizes}" />'
+        )
+        return f"<picture>{source}<img {_format_attrs(img_attrs)} /></picture>"
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Generate responsive WebP/JPEG variants into dist/img/.")
+    parser.add_argument("--dist", type=Path, default=DEFAULT_DIST, help="Output folder (default: dist/).")
+    parser.add_argument(
+        "--cache-dir",
+        type=Path,
+        default=DEFAULT_CACHE_DIR,
+        help="Encoded variant cache (default: .build-cache/images/).",
+    )
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count).")
+    return parser
+
+
+def main(argv: list[str]) -> int:
+    args = build_parser().parse_args(argv)
+    _, report = process_images(SITE_ROOT, args.dist, args.cache_dir, workers=args.workers)
+    for name in report.missing:
+        print(f"[WARNING] Image not found, left untouched: {name}", file=sys.stderr)
+    print(report.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,487 @@
+#!/usr/bin/env python3
+"""
+Assemble the CLN site into dist/ from pages/ and partials/.
+
+Pages live in pages/ and pull the shared markup with an include directive
+on its own line, for instance:
+
+    <!-- @include header.html -->
+
+The directive is replaced by partials/header.html, re-indented to match.
+The navigation link pointing at the current page receives class="active".
+Static assets (styles.css, images, contact.php, standalone HTML documents)
+are copied from the repository root as-is.
+
+Builds are incremental: every input is fingerprinted with SHA-256 (the
+size/mtime pair is used to skip re-hashing untouched files) and each
+output records the hashes of the files it was built from in
+.build-cache/site.json. Editing a partial rebuilds only the pages that
+include it; editing a page rebuilds only that page. Output is a pure
+function of the inputs, so two builds of the same tree are identical
+byte for byte.
+
+Example:
+    $ python build_site.py            # incremental build into dist/
+    $ python build_site.py --force    # wipe dist/ and ignore the cache
+    $ python build_site.py --images   # also run the responsive image stage
+    $ python build_site.py --critical-css   # inline above-the-fold CSS
+    $ python build_site.py --assets   # minify, fingerprint, gzip, .htaccess
+    $ python -m http.server 8000 -d dist
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional, Protocol, Sequence
+
+
+SITE_ROOT = Path(__file__).resolve().parent
+PAGES_DIRNAME = "pages"
+PARTIALS_DIRNAME = "partials"
+DEFAULT_DIST = SITE_ROOT / "dist"
+DEFAULT_CACHE = SITE_ROOT / ".build-cache" / "site.json"
+
+# Bump when the rendering logic changes so every page is rebuilt once.
+BUILDER_VERSION = "2"
+
+STATIC_PATTERNS = ("*.html", "*.css", "*.js", "*.php", "*.png", "*.jpg", "*.jpeg", "*.webp", "*.svg", "*.ico")
+
+INCLUDE_RE = re.compile(
+    r"^(?P<indent>[ \t]*)<!--\s*@include\s+(?P<name>[\w.-]+)\s*-->[ \t]*(?:\r?\n)?",
+    re.MULTILINE,
+)
+NAV_RE = re.compile(r'(<nav class="nav-links">)(.*?)(</nav>)', re.DOTALL)
+IMG_TAG_RE = re.compile(r"<img\b[^>]*>", re.IGNORECASE)
+# Hints for the image stage (build_images.py), meaningless in the published markup.
+WIDTHS_HINT_RE = re.compile(r"""\s+data-widths=(["']).*?\1""", re.IGNORECASE)
+SIZES_ATTR_RE = re.compile(r"""\s+sizes=(["']).*?\1""", re.IGNORECASE)
+SRCSET_ATTR_RE = re.compile(r"\ssrcset=", re.IGNORECASE)
+
+
+class BuildError(RuntimeError):
+    """Raised when a page cannot be assembled (missing or recursive include)."""
+
+
+class PageTransform(Protocol):
+    """Post-processing applied to every rendered page.
+
+    ``key`` must change whenever the transform would produce different
+    output for the same page, since it is part of each page's cache key.
+    """
+
+    key: str
+
+    def __call__(self, html: str, page_name: str) -> str: ...
+
+
+class StaticTransform(Protocol):
+    """Processing applied to the files copied from the repository root.
+
+    ``output_name`` may rename a file (for instance to add a content hash)
+    or return None to leave it out of dist/; ``key`` plays the same role as
+    for PageTransform.
+    """
+
+    key: str
+
+    def output_name(self, rel: str) -> Optional[str]: ...
+
+    def __call__(self, rel: str, data: bytes) -> bytes: ...
+
+
+@dataclass
+class BuildReport:
+    built: list[str] = field(default_factory=list)
+    copied: list[str] = field(default_factory=list)
+    unchanged: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"{len(self.built)} page(s) built, {len(self.copied)} asset(s) copied, "
+            f"{len(self.unchanged)} up to date, {len(self.removed)} removed "
+            f"in {self.seconds * 1000:.1f} ms"
+        )
+
+
+def sha256_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class InputIndex:
+    """Content hashes of the source files, reusing the cached hash when size and mtime match."""
+
+    def __init__(self, root: Path, previous: dict[str, dict]):
+        self.root = root
+        self.previous = previous
+        self.entries: dict[str, dict] = {}
+
+    def entry(self, rel: str) -> dict:
+        if rel in self.entries:
+            return self.entries[rel]
+        path = self.root / rel
+        stat = path.stat()
+        cached = self.previous.get(rel)
+        if cached and cached["size"] == stat.st_size and cached["mtime_ns"] == stat.st_mtime_ns:
+            entry = dict(cached)
+        else:
+            data = path.read_bytes()
+            entry = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256_bytes(data)}
+            if rel.endswith(".html"):
+                entry["includes"] = _find_includes(data.decode("utf-8"))
+        self.entries[rel] = entry
+        return entry
+
+    def digest(self, rel: str) -> str:
+        return self.entry(rel)["sha256"]
+
+
+def _find_includes(text: str) -> list[str]:
+    return sorted({match.group("name") for match in INCLUDE_RE.finditer(text)})
+
+
+def _partial_rel(name: str) -> str:
+    return f"{PARTIALS_DIRNAME}/{name}"
+
+
+def page_dependencies(index: InputIndex, page_rel: str) -> list[str]:
+    """Return the page plus every partial it pulls in, transitively."""
+    deps = [page_rel]
+    stack = [page_rel]
+    seen = {page_rel}
+    while stack:
+        current = stack.pop()
+        try:
+            includes = index.entry(current).get("includes", [])
+        except FileNotFoundError as exc:
+            raise BuildError(f"{page_rel}: missing include {current}") from exc
+        for name in includes:
+            rel = _partial_rel(name)
+            if rel not in seen:
+                seen.add(rel)
+                deps.append(rel)
+                stack.append(rel)
+    return deps
+
+
+def _indent(text: str, indent: str) -> str:
+    if not indent:
+        return text
+    return "".join(indent + line if line.strip() else line for line in text.splitlines(keepends=True))
+
+
+def render_includes(text: str, root: Path, trail: tuple[str, ...] = ()) -> str:
+    def replace(match: re.Match[str]) -> str:
+        name = match.group("name")
+        if name in trail:
+            raise BuildError(f"Recursive include: {' -> '.join(trail + (name,))}")
+        path = root / PARTIALS_DIRNAME / name
+        if not path.is_file():
+            raise BuildError(f"Partial not found: {path.relative_to(root)}")
+        content = render_includes(path.read_text(encoding="utf-8"), root, trail + (name,))
+        if content and not content.endswith("\n"):
+            content += "\n"
+        return _indent(content, match.group("indent"))
+
+    return INCLUDE_RE.sub(replace, text)
+
+
+def mark_active_link(html: str, page_name: str) -> str:
+    """Add class="active" to the navigation link pointing at page_name."""
+
+    def replace(match: re.Match[str]) -> str:
+        links = match.group(2).replace(' class="active"', "")
+        links = links.replace(f'<a href="{page_name}">', f'<a class="active" href="{page_name}">')
+        return match.group(1) + links + match.group(3)
+
+    return NAV_RE.sub(replace, html, count=1)
+
+
+def strip_image_hints(html: str) -> str:
+    """Remove data-widths from every <img>, and sizes from those the image stage left without srcset."""
+
+    def clean(match: re.Match[str]) -> str:
+        tag = WIDTHS_HINT_RE.sub("", match.group(0))
+        if not SRCSET_ATTR_RE.search(tag):
+            tag = SIZES_ATTR_RE.sub("", tag)
+        return tag
+
+    return IMG_TAG_RE.sub(clean, html)
+
+
+def render_page(root: Path, page_rel: str, transforms: Sequence[PageTransform] = ()) -> bytes:
+    page_name = Path(page_rel).name
+    text = (root / page_rel).read_text(encoding="utf-8")
+    html = render_includes(text, root)
+    html = mark_active_link(html, page_name)
+    for transform in transforms:
+        html = transform(html, page_name)
+    return strip_image_hints(html).encode("utf-8")
+
+
+def discover_pages(root: Path) -> list[str]:
+    pages_dir = root / PAGES_DIRNAME
+    if not pages_dir.is_dir():
+        return []
+    return sorted(f"{PAGES_DIRNAME}/{path.name}" for path in pages_dir.glob("*.html") if path.is_file())
+
+
+def discover_static(root: Path) -> list[str]:
+    found = set()
+    for pattern in STATIC_PATTERNS:
+        found.update(path.name for path in root.glob(pattern) if path.is_file())
+    return sorted(found)
+
+
+def _write_atomic(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_bytes(data)
+    os.replace(tmp, path)
+
+
+def _output_intact(path: Path, record: Optional[dict]) -> bool:
+    if not record:
+        return False
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return False
+    return stat.st_size == record["size"] and stat.st_mtime_ns == record["mtime_ns"]
+
+
+def _output_record(path: Path, deps_key: str, deps: list[str], data: bytes) -> dict:
+    stat = path.stat()
+    return {
+        "deps": deps,
+        "deps_key": deps_key,
+        "sha256": sha256_bytes(data),
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+    }
+
+
+def _deps_key(index: InputIndex, deps: list[str], transform_keys: Sequence[str] = ()) -> str:
+    digest = hashlib.sha256(BUILDER_VERSION.encode())
+    for rel in sorted(deps):
+        digest.update(f"{rel}\0{index.digest(rel)}\n".encode())
+    for key in transform_keys:
+        digest.update(f"transform\0{key}\n".encode())
+    return digest.hexdigest()
+
+
+def load_cache(cache_path: Path) -> dict:
+    try:
+        cache = json.loads(cache_path.read_text(encoding="utf-8"))
+    except (FileNotFoundError, ValueError):
+        return {}
+    if cache.get("version") != BUILDER_VERSION:
+        return {}
+    return cache
+
+
+def save_cache(cache_path: Path, cache: dict) -> None:
+    _write_atomic(cache_path, (json.dumps(cache, indent=1, sort_keys=True) + "\n").encode("utf-8"))
+
+
+def clean_dist(dist: Path, root: Path = SITE_ROOT) -> None:
+    """Remove dist/ entirely, so a forced build leaves no stale output behind.
+
+    The cache only knows the outputs of the previous build; after a forced
+    build, renamed sources, old fingerprinted files and their .gz siblings
+    would otherwise stay in dist/ and get deployed.
+    """
+    dist = dist.resolve()
+    if dist == root or dist in root.parents:
+        raise BuildError(f"refusing to wipe {dist}: it contains the sources")
+    if dist.is_dir():
+        shutil.rmtree(dist)
+
+
+def build(
+    root: Path = SITE_ROOT,
+    dist: Path = DEFAULT_DIST,
+    cache_path: Path = DEFAULT_CACHE,
+    *,
+    force: bool = False,
+    transforms: Sequence[PageTransform] = (),
+    static_transforms: Sequence[StaticTransform] = (),
+) -> BuildReport:
+    start = time.perf_counter()
+    report = BuildReport()
+    cache = {} if force else load_cache(cache_path)
+    if cache and cache.get("dist") != str(dist.resolve()):
+        cache = {}
+    index = InputIndex(root, cache.get("inputs", {}))
+    previous_outputs: dict[str, dict] = cache.get("outputs", {})
+    outputs: dict[str, dict] = {}
+    page_keys = [transform.key for transform in transforms]
+    static_keys = [transform.key for transform in static_transforms]
+
+    targets: list[tuple[str, list[str], bool]] = []
+    for page_rel in discover_pages(root):
+        targets.append((Path(page_rel).name, page_dependencies(index, page_rel), True))
+    page_names = {name for name, _, _ in targets}
+    for static_rel in discover_static(root):
+        if static_rel in page_names:
+            raise BuildError(f"{static_rel} exists both in {PAGES_DIRNAME}/ and at the repository root")
+        out_rel: Optional[str] = static_rel
+        for static_transform in static_transforms:
+            out_rel = static_transform.output_name(out_rel)
+            if out_rel is None:
+                break
+        if out_rel is not None:
+            targets.append((out_rel, [static_rel], False))
+
+    for out_rel, deps, is_page in targets:
+        out_path = dist / out_rel
+        deps_key = _deps_key(index, deps, page_keys if is_page else static_keys)
+        record = previous_outputs.get(out_rel)
+        if record and record["deps_key"] == deps_key and _output_intact(out_path, record):
+            outputs[out_rel] = record
+            report.unchanged.append(out_rel)
+            continue
+
+        if is_page:
+            data = render_page(root, deps[0], transforms)
+        else:
+            data = (root / deps[0]).read_bytes()
+            for static_transform in static_transforms:
+                data = static_transform(deps[0], data)
+        _write_atomic(out_path, data)
+        outputs[out_rel] = _output_record(out_path, deps_key, deps, data)
+        (report.built if is_page else report.copied).append(out_rel)
+
+    for stale in sorted(set(previous_outputs) - set(outputs)):
+        (dist / stale).unlink(missing_ok=True)
+        report.removed.append(stale)
+
+    save_cache(
+        cache_path,
+        {
+            "version": BUILDER_VERSION,
+            "dist": str(dist.resolve()),
+            "inputs": index.entries,
+            "outputs": outputs,
+        },
+    )
+    report.seconds = time.perf_counter() - start
+    return report
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Build the CLN static site into dist/.")
+    parser.add_argument("--dist", type=Path, default=DEFAULT_DIST, help="Output folder (default: dist/).")
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=DEFAULT_CACHE,
+        help="Dependency cache file (default: .build-cache/site.json).",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Wipe the output folder and rebuild everything, ignoring the cache.",
+    )
+    parser.add_argument(
+        "--images",
+        action="store_true",
+        help="Generate responsive image variants and rewrite <img> tags (requires Pillow).",
+    )
+    parser.add_argument("--workers", type=int, help="Worker processes for the image stage.")
+    parser.add_argument(
+        "--critical-css",
+        action="store_true",
+        help="Inline each page's above-the-fold CSS and load the stylesheet asynchronously.",
+    )
+    parser.add_argument(
+        "--fold-elements",
+        type=int,
+        help="Critical CSS: add sections of <main> to the fold until they hold this many elements (default: 30).",
+    )
+    parser.add_argument(
+        "--assets",
+        action="store_true",
+        help="Minify and fingerprint assets, write .gz siblings and .htaccess.",
+    )
+    parser.add_argument("--verbose", action="store_true", help="List every file written or removed.")
+    return parser
+
+
+def main(argv: list[str]) -> int:
+    args = build_parser().parse_args(argv)
+    transforms: list[PageTransform] = []
+    static_transforms: list[StaticTransform] = []
+    try:
+        # Before the image stage, which publishes straight into dist/img/.
+        if args.force:
+            clean_dist(args.dist)
+        if args.images:
+            from build_images import ResponsiveImages, process_images
+
+            images, image_report = process_images(SITE_ROOT, args.dist, workers=args.workers)
+            for name in image_report.missing:
+                print(f"[WARNING] Image not found, left untouched: {name}", file=sys.stderr)
+            print(image_report.summary())
+            responsive = ResponsiveImages(images)
+            transforms.append(responsive)
+        if args.critical_css:
+            from critical_css import DEFAULT_FOLD_ELEMENTS, CriticalCss
+
+            fold_elements = DEFAULT_FOLD_ELEMENTS if args.fold_elements is None else args.fold_elements
+            critical = CriticalCss(SITE_ROOT, fold_elements=fold_elements)
+            transforms.append(critical)
+        # Must come last: it rewrites the references added by the other transforms.
+        if args.assets:
+            from build_assets import FingerprintedAssets, MinifiedPages, plan_assets
+
+            # Only the image stage removes references; critical CSS keeps the stylesheet link.
+            plan = plan_assets(SITE_ROOT, args.cache, [responsive] if args.images else [])
+            transforms.append(MinifiedPages(plan))
+            static_transforms.append(FingerprintedAssets(plan))
+        report = build(
+            SITE_ROOT,
+            args.dist,
+            args.cache,
+            force=args.force,
+            transforms=transforms,
+            static_transforms=static_transforms,
+        )
+    except BuildError as exc:
+        print(f"[ERROR] {exc}", file=sys.stderr)
+        return 1
+
+    if args.verbose:
+        for name in report.built:
+            print(f"  built   {name}")
+        for name in report.copied:
+            print(f"  copied  {name}")
+        for name in report.removed:
+            print(f"  removed {name}")
+    print(report.summary())
+    if args.critical_css:
+        from critical_css import format_report
+
+        critical.save()
+        if critical.stats:
+            print(format_report(critical.stats))
+    if args.assets:
+        from build_assets import precompress, write_htaccess
+
+        write_htaccess(args.dist)
+        print(precompress(args.dist).summary())
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
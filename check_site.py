@@ -0,0 +1,550 @@
+#!/usr/bin/env python3
+"""
+Link checker and page-weight budget gate for the built site.
+
+The script serves dist/ on a local port, then crawls every page
+concurrently with asyncio:
+
+- every href/src/srcset must resolve (HTTP 200), and an anchor such as
+  solutions.html#connecter must match an id (or name) on the target page;
+- each page's transfer weight is the sum of the bytes sent for the page
+  and everything it loads (stylesheets, scripts, images, CSS url() assets),
+  counted once per URL, along with the number of requests.
+
+The local server mirrors the production .htaccess: when the client accepts
+gzip and a .gz sibling exists, the compressed file is sent, so the weights
+match what visitors download. For responsive images the candidate a
+desktop browser would pick (--viewport, default 1280 px) is counted,
+preferring the WebP <source>.
+
+The exit code is 1 when a link is broken or a page exceeds its budget, so
+the script can gate a deployment.
+
+Example:
+    $ python build_site.py --images --critical-css --assets
+    $ python check_site.py --budget 500000 --max-requests 20
+    $ python check_site.py --page-budget index.html=300000 --json report.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import fnmatch
+import json
+import re
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+from functools import partial
+from html.parser import HTMLParser
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Optional
+from urllib.parse import quote, unquote, urldefrag, urljoin, urlsplit, urlunsplit
+
+
+DEFAULT_DIST = Path(__file__).resolve().parent / "dist"
+DEFAULT_BUDGET = 500_000
+DEFAULT_VIEWPORT = 1280
+SKIPPED_SCHEMES = ("mailto:", "tel:", "javascript:", "data:")
+CSS_URL_RE = re.compile(r"""url\(\s*(['"]?)([^'")]+)\1\s*\)""")
+SIZES_LENGTH_RE = re.compile(r"^(\d+(?:\.\d+)?)(px|vw)$")
+
+
+# --------------------------------------------------------------------------- local server
+
+
+class GzipAwareHandler(SimpleHTTPRequestHandler):
+    """Static handler serving the .gz sibling when the client accepts gzip, like the .htaccess."""
+
+    def send_head(self):  # type: ignore[override]
+        path = Path(self.translate_path(self.path))
+        if path.is_dir():
+            path = path / "index.html"
+        compressed = path.with_name(path.name + ".gz")
+        if (
+            "gzip" in self.headers.get("Accept-Encoding", "")
+            and path.is_file()
+            and compressed.is_file()
+            and compressed.stat().st_mtime >= path.stat().st_mtime  # ignore .gz left by an older build
+        ):
+            data = compressed.read_bytes()
+            self.send_response(200)
+            self.send_header("Content-Type", self.guess_type(str(path)))
+            self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            return _BytesFile(data)
+        return super().send_head()
+
+    def log_message(self, format: str, *args: object) -> None:
+        pass
+
+
+class _BytesFile:
+    def __init__(self, data: bytes):
+        self.data = data
+
+    def read(self, size: int = -1) -> bytes:
+        data, self.data = self.data, b""
+        return data
+
+    def close(self) -> None:
+        pass
+
+
+class _CheckServer(ThreadingHTTPServer):
+    # socketserver's default listen backlog of 5 drops connections beyond it, which then
+    # wait for the 1 s SYN retry; keep it well above --concurrency.
+    request_queue_size = 256
+
+
+def serve(directory: Path) -> ThreadingHTTPServer:
+    server = _CheckServer(("127.0.0.1", 0), partial(GzipAwareHandler, directory=str(directory)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --------------------------------------------------------------------------- fetching
+
+
+@dataclass
+class Response:
+    status: int
+    headers: dict[str, str]
+    body: bytes
+    transfer_bytes: int
+
+
+# Characters left as-is when percent-encoding a path; "%" keeps existing escapes intact.
+PATH_SAFE = "/%:@!$&'()*+,;=~"
+
+
+def quote_url(url: str) -> str:
+    """Percent-encode the path of ``url`` (page names contain spaces and accents)."""
+    parts = urlsplit(url)
+    return urlunsplit(parts._replace(path=quote(parts.path, safe=PATH_SAFE)))
+
+
+async def fetch(url: str, *, timeout: float = 15.0) -> Response:
+    """Minimal HTTP/1.1 GET over asyncio streams (the local server only speaks plain HTTP)."""
+    parts = urlsplit(quote_url(url))
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(parts.hostname, parts.port or 80), timeout)
+    try:
+        target = parts.path or "/"
+        if parts.query:
+            target += f"?{parts.query}"
+        writer.write(
+            f"GET {target} HTTP/1.1\r\nHost: {parts.netloc}\r\n"
+            "Accept-Encoding: gzip\r\nConnection: close\r\n\r\n".encode("latin-1")
+        )
+        await writer.drain()
+        raw = await asyncio.wait_for(reader.read(), timeout)
+    finally:
+        writer.close()
+    head, _, body = raw.partition(b"\r\n\r\n")
+    lines = head.decode("latin-1").split("\r\n")
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return Response(status, headers, body, len(raw))
+
+
+async def fetch_external(url: str, *, timeout: float = 15.0) -> int:
+    import urllib.error
+    import urllib.request
+
+    def request() -> int:
+        try:
+            req = urllib.request.Request(url, method="HEAD", headers={"User-Agent": "cln-link-check"})
+            with urllib.request.urlopen(req, timeout=timeout) as reply:
+                return reply.status
+        except urllib.error.HTTPError as exc:
+            return exc.code
+
+    return await asyncio.to_thread(request)
+
+
+# --------------------------------------------------------------------------- parsing
+
+
+@dataclass
+class PageLinks:
+    links: list[str] = field(default_factory=list)
+    resources: list[str] = field(default_factory=list)
+    anchors: set[str] = field(default_factory=set)
+
+
+def _srcset_candidates(value: str) -> list[tuple[str, int]]:
+    candidates = []
+    for item in value.split(","):
+        parts = item.strip().split()
+        if not parts:
+            continue
+        width = 0
+        if len(parts) > 1 and parts[1].endswith("w") and parts[1][:-1].isdigit():
+            width = int(parts[1][:-1])
+        candidates.append((parts[0], width))
+    return candidates
+
+
+def _slot_width(sizes: Optional[str], viewport: int) -> float:
+    """Width of the image slot, using the last (default) length of the sizes attribute."""
+    if not sizes:
+        return viewport
+    match = SIZES_LENGTH_RE.match(sizes.split(",")[-1].strip())
+    if not match:
+        return viewport
+    value, unit = float(match.group(1)), match.group(2)
+    return value if unit == "px" else viewport * value / 100
+
+
+def pick_candidate(srcset: str, sizes: Optional[str], viewport: int) -> Optional[str]:
+    candidates = sorted(_srcset_candidates(srcset), key=lambda item: item[1])
+    if not candidates:
+        return None
+    slot = _slot_width(sizes, viewport)
+    for url, width in candidates:
+        if width >= slot:
+            return url
+    return candidates[-1][0]
+
+
+class _PageParser(HTMLParser):
+    def __init__(self, viewport: int):
+        super().__init__(convert_charrefs=True)
+        self.viewport = viewport
+        self.result = PageLinks()
+        self._picture_source: Optional[str] = None
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        values = {name: value or "" for name, value in attrs}
+        for name in ("id", "name"):
+            if values.get(name) and tag != "meta":
+                self.result.anchors.add(values[name])
+
+        if tag == "picture":
+            self._picture_source = None
+        elif tag == "source" and "srcset" in values:
+            self.result.links.extend(url for url, _ in _srcset_candidates(values["srcset"]))
+            if self._picture_source is None and values.get("type", "image/webp") == "image/webp":
+                self._picture_source = pick_candidate(values["srcset"], values.get("sizes"), self.viewport)
+        elif tag == "img":
+            for url, _ in _srcset_candidates(values.get("srcset", "")):
+                self.result.links.append(url)
+            if values.get("src"):
+                self.result.links.append(values["src"])
+            chosen = self._picture_source
+            if chosen is None and values.get("srcset"):
+                chosen = pick_candidate(values["srcset"], values.get("sizes"), self.viewport)
+            chosen = chosen or values.get("src")
+            if chosen:
+                self.result.resources.append(chosen)
+        elif tag == "link" and values.get("href"):
+            self.result.links.append(values["href"])
+            rel = values.get("rel", "").lower().split()
+            if "stylesheet" in rel or ("preload" in rel and values.get("as") in {"style", "script", "font", "image"}):
+                self.result.resources.append(values["href"])
+        elif tag == "script" and values.get("src"):
+            self.result.links.append(values["src"])
+            self.result.resources.append(values["src"])
+        elif values.get("href"):
+            self.result.links.append(values["href"])
+        elif values.get("src"):
+            self.result.links.append(values["src"])
+            self.result.resources.append(values["src"])
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag == "picture":
+            self._picture_source = None
+
+
+def parse_page(html: str, viewport: int) -> PageLinks:
+    parser = _PageParser(viewport)
+    parser.feed(html)
+    parser.close()
+    return parser.result
+
+
+def _decode(response: Response) -> bytes:
+    if response.headers.get("content-encoding") == "gzip":
+        import gzip
+
+        return gzip.decompress(response.body)
+    return response.body
+
+
+# --------------------------------------------------------------------------- crawl
+
+
+@dataclass
+class BrokenLink:
+    page: str
+    link: str
+    reason: str
+
+
+@dataclass
+class PageWeight:
+    page: str
+    transfer_bytes: int
+    requests: int
+    budget: int
+    resources: dict[str, int] = field(default_factory=dict)
+
+    @property
+    def over_budget(self) -> bool:
+        return self.transfer_bytes > self.budget
+
+
+@dataclass
+class CheckReport:
+    pages: list[PageWeight] = field(default_factory=list)
+    broken: list[BrokenLink] = field(default_factory=list)
+    skipped_external: int = 0
+    seconds: float = 0.0
+
+
+class SiteChecker:
+    def __init__(
+        self,
+        base_url: str,
+        dist: Path,
+        *,
+        budget: int,
+        page_budgets: dict[str, int],
+        viewport: int,
+        concurrency: int,
+        external: bool,
+        ignore: list[str],
+    ):
+        self.base_url = base_url
+        self.dist = dist
+        self.budget = budget
+        self.page_budgets = page_budgets
+        self.viewport = viewport
+        self.external = external
+        self.ignore = ignore
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.responses: dict[str, asyncio.Task[Response]] = {}
+        self.pages: dict[str, PageLinks] = {}
+        self.report = CheckReport()
+
+    def _ignored(self, url: str) -> bool:
+        path = urlsplit(url).path.lstrip("/")
+        return any(fnmatch.fnmatch(path, pattern) or fnmatch.fnmatch(url, pattern) for pattern in self.ignore)
+
+    async def _fetch(self, url: str) -> Response:
+        async with self.semaphore:
+            return await fetch(url)
+
+    def get(self, url: str) -> asyncio.Task[Response]:
+        """Fetch each URL once, however many pages reference it."""
+        if url not in self.responses:
+            self.responses[url] = asyncio.ensure_future(self._fetch(url))
+        return self.responses[url]
+
+    async def page_links(self, url: str) -> Optional[PageLinks]:
+        if url not in self.pages:
+            response = await self.get(url)
+            if response.status != 200:
+                return None
+            self.pages[url] = parse_page(_decode(response).decode("utf-8", "replace"), self.viewport)
+        return self.pages[url]
+
+    async def resource_size(self, url: str) -> tuple[int, list[str]]:
+        response = await self.get(url)
+        extra: list[str] = []
+        if response.status == 200 and response.headers.get("content-type", "").startswith("text/css"):
+            css = _decode(response).decode("utf-8", "replace")
+            extra = [quote_url(urljoin(url, match.group(2))) for match in CSS_URL_RE.finditer(css)]
+        return response.transfer_bytes, extra
+
+    async def check_link(self, page_url: str, link: str) -> None:
+        link = link.strip()
+        page = self._name(page_url)
+        if not link or link.startswith(SKIPPED_SCHEMES) or self._ignored(link):
+            return
+        absolute = quote_url(urljoin(page_url, link))
+        target, fragment = urldefrag(absolute)
+        if not target.startswith(self.base_url):
+            if not self.external:
+                self.report.skipped_external += 1
+                return
+            try:
+                status = await fetch_external(target)
+            except OSError as exc:
+                self.report.broken.append(BrokenLink(page, link, str(exc)))
+                return
+            if status >= 400:
+                self.report.broken.append(BrokenLink(page, link, f"HTTP {status}"))
+            return
+
+        response = await self.get(target)
+        if response.status != 200:
+            self.report.broken.append(BrokenLink(page, link, f"HTTP {response.status}"))
+            return
+        if fragment and urlsplit(target).path.endswith((".html", "/")):
+            links = await self.page_links(target)
+            if links is not None and unquote(fragment) not in links.anchors:
+                self.report.broken.append(BrokenLink(page, link, f"no element with id '{fragment}'"))
+
+    async def weigh(self, page_url: str) -> PageWeight:
+        page = self._name(page_url)
+        links = await self.page_links(page_url)
+        html_response = await self.get(page_url)
+        resources = {page: html_response.transfer_bytes}
+        pending = [quote_url(urljoin(page_url, url)) for url in (links.resources if links else [])]
+        seen = {page_url}
+        while pending:
+            url = urldefrag(pending.pop())[0]
+            if url in seen or not url.startswith(self.base_url) or self._ignored(url):
+                continue
+            seen.add(url)
+            size, extra = await self.resource_size(url)
+            resources[self._name(url)] = size
+            pending.extend(extra)
+        return PageWeight(
+            page=page,
+            transfer_bytes=sum(resources.values()),
+            requests=len(resources),
+            budget=self.page_budgets.get(page, self.budget),
+            resources=resources,
+        )
+
+    def _name(self, url: str) -> str:
+        return unquote(url[len(self.base_url) :]) or "index.html"
+
+    async def run(self) -> CheckReport:
+        start = time.perf_counter()
+        queue = [self.base_url + quote(path.name, safe=PATH_SAFE) for path in sorted(self.dist.glob("*.html"))]
+        seeds = set(queue)
+        crawled: set[str] = set()
+        while queue:
+            batch = [url for url in dict.fromkeys(queue) if url not in crawled]
+            crawled.update(batch)
+            queue = []
+            await asyncio.gather(*(self.page_links(url) for url in batch))
+            checks = []
+            for url in batch:
+                links = self.pages.get(url)
+                if links is None:
+                    # Pages reached through a link are reported by check_link on the linking page.
+                    if url in seeds:
+                        status = (await self.get(url)).status
+                        self.report.broken.append(BrokenLink(self._name(url), self._name(url), f"HTTP {status}"))
+                    continue
+                checks.extend(self.check_link(url, link) for link in links.links)
+                for link in links.links:
+                    target = urldefrag(quote_url(urljoin(url, link)))[0]
+                    if target.startswith(self.base_url) and target.endswith(".html") and target not in crawled:
+                        queue.append(target)
+            await asyncio.gather(*checks)
+
+        self.report.pages = list(await asyncio.gather(*(self.weigh(url) for url in sorted(self.pages))))
+        self.report.seconds = time.perf_counter() - start
+        return self.report
+
+
+# --------------------------------------------------------------------------- cli
+
+
+def _parse_page_budget(value: str) -> tuple[str, int]:
+    page, _, budget = value.partition("=")
+    if not page or not budget.isdigit():
+        raise argparse.ArgumentTypeError("expected PAGE=BYTES, e.g. index.html=300000")
+    return page, int(budget)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Check links and page weight of the built site.")
+    parser.add_argument("--dist", type=Path, default=DEFAULT_DIST, help="Built site to serve (default: dist/).")
+    parser.add_argument(
+        "--budget",
+        type=int,
+        default=DEFAULT_BUDGET,
+        help=f"Maximum transfer bytes per page (default: {DEFAULT_BUDGET}).",
+    )
+    parser.add_argument(
+        "--page-budget",
+        type=_parse_page_budget,
+        action="append",
+        default=[],
+        metavar="PAGE=BYTES",
+        help="Per-page budget override (repeatable).",
+    )
+    parser.add_argument("--max-requests", type=int, help="Maximum requests per page (default: no limit).")
+    parser.add_argument(
+        "--viewport",
+        type=int,
+        default=DEFAULT_VIEWPORT,
+        help=f"Viewport width used to pick srcset candidates (default: {DEFAULT_VIEWPORT}).",
+    )
+    parser.add_argument("--concurrency", type=int, default=16, help="Concurrent requests (default: 16).")
+    parser.add_argument("--external", action="store_true", help="Also check external http(s) links.")
+    parser.add_argument(
+        "--ignore",
+        action="append",
+        default=[],
+        metavar="GLOB",
+        help="Links to leave unchecked (repeatable), e.g. --ignore 'legacy/*'.",
+    )
+    parser.add_argument("--json", type=Path, help="Write the full report as JSON.")
+    return parser
+
+
+def main(argv: list[str]) -> int:
+    args = build_parser().parse_args(argv)
+    if not args.dist.is_dir():
+        raise SystemExit(f"Built site not found: {args.dist} (run build_site.py first).")
+
+    server = serve(args.dist)
+    try:
+        checker = SiteChecker(
+            f"http://127.0.0.1:{server.server_address[1]}/",
+            args.dist,
+            budget=args.budget,
+            page_budgets=dict(args.page_budget),
+            viewport=args.viewport,
+            concurrency=max(1, args.concurrency),
+            external=args.external,
+            ignore=args.ignore,
+        )
+        report = asyncio.run(checker.run())
+    finally:
+        server.shutdown()
+
+    failed = False
+    print(f"{'page':<36} {'requests':>8} {'transfer':>11} {'budget':>11}")
+    for weight in report.pages:
+        over_requests = args.max_requests is not None and weight.requests > args.max_requests
+        flag = "  OVER BUDGET" if weight.over_budget else ""
+        flag += "  TOO MANY REQUESTS" if over_requests else ""
+        failed = failed or weight.over_budget or over_requests
+        print(f"{weight.page:<36} {weight.requests:>8} {weight.transfer_bytes:>9} B {weight.budget:>9} B{flag}")
+
+    for broken in report.broken:
+        print(f"[ERROR] {broken.page}: {broken.link} ({broken.reason})", file=sys.stderr)
+    failed = failed or bool(report.broken)
+    print(
+        f"{len(report.pages)} page(s), {len(checker.responses)} URL(s) fetched, {len(report.broken)} broken link(s), "
+        f"{report.skipped_external} external skipped in {report.seconds * 1000:.0f} ms"
+    )
+
+    if args.json:
+        payload = {
+            "pages": [asdict(weight) for weight in report.pages],
+            "broken": [asdict(broken) for broken in report.broken],
+            "skipped_external": report.skipped_external,
+            "seconds": round(report.seconds, 4),
+        }
+        args.json.write_text(json.dumps(payload, indent=2) + "\n", encoding="utf-8")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
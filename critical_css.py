@@ -0,0 +1,569 @@
+#!/usr/bin/env python3
+"""
+Critical CSS extraction for the CLN pages.
+
+Each page links the whole of styles.css, which blocks rendering even though
+a page like merci.html only uses a fraction of it. This stage parses the
+stylesheet and the page DOM, keeps the rules whose selectors match an
+element above the fold (the site <header> and the leading <section>s of
+<main>, plus their ancestors) and inlines that subset in a <style> block.
+Sections are added until they hold --fold-elements elements (30 by
+default), so the card or grid that follows a short title section on a
+desktop screen is styled at first paint too.
+The full stylesheet is then loaded without blocking rendering:
+
+    <link rel="preload" href="styles.css" as="style" onload="this.onload=null;this.rel='stylesheet'" />
+    <noscript><link rel="stylesheet" href="styles.css" /></noscript>
+
+Rules that only apply in an interactive state (:hover, :focus, ...) are
+left to the full stylesheet; unknown pseudo-classes are treated as
+matching so nothing visible is ever dropped. The matched rule indices are
+cached per page in .build-cache/critical.json, keyed by the stylesheet and
+page hashes, so reruns skip the matching entirely.
+
+Example:
+    $ python build_site.py --critical-css            # inline while building
+    $ python critical_css.py                         # report bytes saved per page
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+from dataclasses import dataclass, field
+from functools import lru_cache
+from html.parser import HTMLParser
+from pathlib import Path
+from typing import Optional
+
+from build_site import SITE_ROOT, _write_atomic, discover_pages, render_page
+
+
+CRITICAL_VERSION = "2"
+DEFAULT_CACHE = SITE_ROOT / ".build-cache" / "critical.json"
+# Element count standing in for height: sections of <main> are added to the fold until they hold this many.
+DEFAULT_FOLD_ELEMENTS = 30
+
+VOID_ELEMENTS = {"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"}
+# States that cannot be active at first paint: the full stylesheet covers them.
+DYNAMIC_PSEUDOS = {"hover", "focus", "active", "focus-visible", "focus-within", "visited", "target"}
+PSEUDO_ELEMENTS = {"before", "after", "first-line", "first-letter", "placeholder", "marker", "selection"}
+
+STYLESHEET_LINK_RE = re.compile(
+    r"""^(?P<indent>[ \t]*)<link\b(?=[^>]*\brel=["']stylesheet["'])[^>]*\bhref=["'](?P<href>[^"'#?]+\.css)["'][^>]*>[ \t]*$""",
+    re.IGNORECASE | re.MULTILINE,
+)
+
+
+# --------------------------------------------------------------------------- stylesheet
+
+
+@dataclass
+class CssRule:
+    selectors: list[str]
+    body: str
+    # Enclosing conditional at-rule preludes, outermost first ("@media (max-width: 720px)").
+    conditions: tuple[str, ...] = ()
+    # Verbatim text for at-rules kept whole (@font-face, @keyframes, @import...).
+    raw: Optional[str] = None
+
+
+def _strip_comments(css: str) -> str:
+    return re.sub(r"/\*.*?\*/", "", css, flags=re.DOTALL)
+
+
+def _matching_brace(css: str, start: int) -> int:
+    depth = 0
+    quote = ""
+    for index in range(start, len(css)):
+        char = css[index]
+        if quote:
+            if char == quote and css[index - 1] != "\\":
+                quote = ""
+        elif char in "'\"":
+            quote = char
+        elif char == "{":
+            depth += 1
+        elif char == "}":
+            depth -= 1
+            if depth == 0:
+                return index
+    return len(css) - 1
+
+
+def split_selector_list(prelude: str) -> list[str]:
+    parts, depth, current = [], 0, []
+    for char in prelude:
+        if char in "([":
+            depth += 1
+        elif char in ")]":
+            depth -= 1
+        if char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+        else:
+            current.append(char)
+    parts.append("".join(current).strip())
+    return [part for part in parts if part]
+
+
+def parse_stylesheet(css: str, conditions: tuple[str, ...] = ()) -> list[CssRule]:
+    css = _strip_comments(css) if not conditions else css
+    rules: list[CssRule] = []
+    index = 0
+    while index < len(css):
+        brace = css.find("{", index)
+        semicolon = css.find(";", index)
+        if brace == -1 and semicolon == -1:
+            break
+        if semicolon != -1 and (brace == -1 or semicolon < brace) and css[index:semicolon].strip().startswith("@"):
+            rules.append(CssRule([], "", conditions, raw=css[index : semicolon + 1].strip()))
+            index = semicolon + 1
+            continue
+        if brace == -1:
+            break
+        end = _matching_brace(css, brace)
+        prelude = " ".join(css[index:brace].split())
+        body = css[brace + 1 : end]
+        if prelude.startswith(("@media", "@supports")):
+            rules.extend(parse_stylesheet(body, conditions + (prelude,)))
+        elif prelude.startswith("@"):
+            rules.append(CssRule([], "", conditions, raw=f"{prelude}{{{body.strip()}}}"))
+        else:
+            rules.append(CssRule(split_selector_list(prelude), " ".join(body.split()), conditions))
+        index = end + 1
+    return rules
+
+
+def serialize_rules(rules: list[CssRule]) -> str:
+    out: list[str] = []
+    open_conditions: tuple[str, ...] = ()
+    for rule in rules:
+        if rule.conditions != open_conditions:
+            out.append("}" * len(open_conditions))
+            out.extend(f"{condition}{{" for condition in rule.conditions)
+            open_conditions = rule.conditions
+        if rule.raw is not None:
+            out.append(rule.raw)
+        else:
+            out.append(f"{','.join(rule.selectors)}{{{rule.body}}}")
+    out.append("}" * len(open_conditions))
+    return "".join(out)
+
+
+# --------------------------------------------------------------------------- document
+
+
+@dataclass(eq=False)
+class Element:
+    tag: str
+    attrs: dict[str, str]
+    parent: Optional["Element"] = None
+    children: list["Element"] = field(default_factory=list)
+
+    @property
+    def classes(self) -> set[str]:
+        return set(self.attrs.get("class", "").split())
+
+    def siblings_before(self) -> list["Element"]:
+        if self.parent is None:
+            return []
+        siblings = self.parent.children
+        return siblings[: siblings.index(self)]
+
+    def iter(self):
+        yield self
+        for child in self.children:
+            yield from child.iter()
+
+
+class _TreeBuilder(HTMLParser):
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.root = Element("#document", {})
+        self.stack = [self.root]
+
+    def handle_starttag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        element = Element(tag, {name: value or "" for name, value in attrs}, self.stack[-1])
+        self.stack[-1].children.append(element)
+        if tag not in VOID_ELEMENTS:
+            self.stack.append(element)
+
+    def handle_startendtag(self, tag: str, attrs: list[tuple[str, Optional[str]]]) -> None:
+        element = Element(tag, {name: value or "" for name, value in attrs}, self.stack[-1])
+        self.stack[-1].children.append(element)
+
+    def handle_endtag(self, tag: str) -> None:
+        for depth in range(len(self.stack) - 1, 0, -1):
+            if self.stack[depth].tag == tag:
+                del self.stack[depth:]
+                return
+
+
+def parse_document(html: str) -> Element:
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+    return builder.root
+
+
+def _top_sections(main: Element) -> list[Element]:
+    sections = []
+    for child in main.children:
+        if child.tag == "section":
+            sections.append(child)
+        else:
+            sections.extend(_top_sections(child))
+    return sections
+
+
+def above_the_fold(document: Element, fold_elements: int = DEFAULT_FOLD_ELEMENTS) -> set[Element]:
+    """The site header and the leading sections of <main>, with their ancestors.
+
+    Sections are taken in order while the ones already taken hold fewer than
+    ``fold_elements`` elements; the first section is always taken.
+    """
+    elements = list(document.iter())
+    regions = []
+    header = next((el for el in elements if el.tag == "header"), None)
+    main = next((el for el in elements if el.tag == "main"), None)
+    if header is not None:
+        regions.append(header)
+    if main is not None:
+        sections = _top_sections(main)
+        count = 0
+        for index, section in enumerate(sections):
+            if index and count >= fold_elements:
+                break
+            regions.append(section)
+            count += sum(1 for _ in section.iter())
+        if not sections:
+            regions.append(main)
+    if not regions:
+        body = next((el for el in elements if el.tag == "body"), document)
+        regions.append(body)
+
+    fold: set[Element] = set()
+    for region in regions:
+        fold.update(region.iter())
+        ancestor = region.parent
+        while ancestor is not None:
+            fold.add(ancestor)
+            ancestor = ancestor.parent
+    return fold
+
+
+# --------------------------------------------------------------------------- selectors
+
+COMPOUND_TOKEN_RE = re.compile(
+    r"""
+    (?P<universal>\*)
+  | (?P<tag>[a-zA-Z][\w-]*)
+  | \#(?P<id>[\w-]+)
+  | \.(?P<cls>[\w-]+)
+  | \[\s*(?P<attr>[\w-]+)\s*(?:(?P<op>[~|^$*]?=)\s*(?P<value>"[^"]*"|'[^']*'|[^\]\s]+))?\s*\]
+  | ::?(?P<pseudo>[\w-]+)(?:\((?P<args>(?:[^()]|\([^()]*\))*)\))?
+    """,
+    re.VERBOSE,
+)
+COMBINATOR_RE = re.compile(r"\s*([>+~])\s*|\s+")
+
+
+class UnsupportedSelector(ValueError):
+    pass
+
+
+@lru_cache(maxsize=None)
+def parse_selector(selector: str) -> tuple[tuple[str, tuple], ...]:
+    """Split a complex selector into (combinator, compound) pairs, leftmost first."""
+    parts: list[tuple[str, tuple]] = []
+    combinator = ""
+    index = 0
+    selector = selector.strip()
+    while index < len(selector):
+        compound = []
+        while index < len(selector):
+            match = COMPOUND_TOKEN_RE.match(selector, index)
+            if not match:
+                break
+            compound.append((match.lastgroup, match.groupdict()))
+            index = match.end()
+        if not compound:
+            raise UnsupportedSelector(selector)
+        parts.append((combinator, tuple((kind, tuple(sorted(groups.items()))) for kind, groups in compound)))
+        separator = COMBINATOR_RE.match(selector, index)
+        if separator and index < len(selector):
+            combinator = separator.group(1) or " "
+            index = separator.end()
+    return tuple(parts)
+
+
+def _nth(expression: str, position: int) -> bool:
+    expression = expression.replace(" ", "").lower()
+    if expression == "odd":
+        return position % 2 == 1
+    if expression == "even":
+        return position % 2 == 0
+    match = re.fullmatch(r"([+-]?\d*)n([+-]\d+)?", expression)
+    if not match:
+        return expression.lstrip("+").isdigit() and position == int(expression)
+    step_raw, offset_raw = match.groups()
+    step = -1 if step_raw == "-" else int(step_raw) if step_raw not in ("", "+") else 1
+    offset = int(offset_raw or 0)
+    if step == 0:
+        return position == offset
+    return (position - offset) % step == 0 and (position - offset) // step >= 0
+
+
+def _match_pseudo(element: Element, name: str, args: Optional[str]) -> bool:
+    name = name.lower()
+    if name in PSEUDO_ELEMENTS:
+        return True
+    if name in DYNAMIC_PSEUDOS:
+        return False
+    if name == "root":
+        return element.parent is not None and element.parent.tag == "#document"
+    if name in {"link", "any-link"}:
+        return element.tag == "a" and "href" in element.attrs
+    if name == "not" and args is not None:
+        return not any(_match_complex(element, selector) for selector in split_selector_list(args))
+    if name in {"is", "where", "matches"} and args is not None:
+        return any(_match_complex(element, selector) for selector in split_selector_list(args))
+    if name in {"checked", "disabled"}:
+        return name in element.attrs
+    if name == "enabled":
+        return "disabled" not in element.attrs
+    if name == "empty":
+        return not element.children
+    siblings = element.parent.children if element.parent else [element]
+    same_type = [sibling for sibling in siblings if sibling.tag == element.tag]
+    if name == "first-child":
+        return siblings[0] is element
+    if name == "last-child":
+        return siblings[-1] is element
+    if name == "only-child":
+        return len(siblings) == 1
+    if name == "first-of-type":
+        return same_type[0] is element
+    if name == "last-of-type":
+        return same_type[-1] is element
+    if name == "nth-child" and args:
+        return _nth(args, siblings.index(element) + 1)
+    if name == "nth-of-type" and args:
+        return _nth(args, same_type.index(element) + 1)
+    # Unknown pseudo-class: keep the rule rather than risk a flash of unstyled content.
+    return True
+
+
+def _match_compound(element: Element, compound: tuple) -> bool:
+    if element.tag.startswith("#"):
+        return False
+    for kind, raw_groups in compound:
+        groups = dict(raw_groups)
+        if kind == "tag" and element.tag != groups["tag"].lower():
+            return False
+        if kind == "id" and element.attrs.get("id") != groups["id"]:
+            return False
+        if kind == "cls" and groups["cls"] not in element.classes:
+            return False
+        if kind == "attr":
+            name = groups["attr"].lower()
+            if name not in element.attrs:
+                return False
+            if groups["op"]:
+                expected = groups["value"].strip("\"'")
+                actual = element.attrs[name]
+                op = groups["op"]
+                if op == "=" and actual != expected:
+                    return False
+                if op == "~=" and expected not in actual.split():
+                    return False
+                if op == "|=" and actual != expected and not actual.startswith(expected + "-"):
+                    return False
+                if op == "^=" and not actual.startswith(expected):
+                    return False
+                if op == "$=" and not actual.endswith(expected):
+                    return False
+                if op == "*=" and expected not in actual:
+                    return False
+        if kind == "pseudo" and not _match_pseudo(element, groups["pseudo"], groups["args"]):
+            return False
+    return True
+
+
+def _match_parts(element: Element, parts: tuple, index: int) -> bool:
+    combinator, compound = parts[index]
+    if not _match_compound(element, compound):
+        return False
+    if index == 0:
+        return True
+    if combinator == ">":
+        return element.parent is not None and _match_parts(element.parent, parts, index - 1)
+    if combinator == " ":
+        ancestor = element.parent
+        while ancestor is not None:
+            if _match_parts(ancestor, parts, index - 1):
+                return True
+            ancestor = ancestor.parent
+        return False
+    previous = element.siblings_before()
+    if combinator == "+":
+        return bool(previous) and _match_parts(previous[-1], parts, index - 1)
+    return any(_match_parts(sibling, parts, index - 1) for sibling in previous)
+
+
+def _match_complex(element: Element, selector: str) -> bool:
+    try:
+        parts = parse_selector(selector)
+    except UnsupportedSelector:
+        return True
+    return _match_parts(element, parts, len(parts) - 1)
+
+
+def critical_rule_indices(
+    rules: list[CssRule], document: Element, fold_elements: int = DEFAULT_FOLD_ELEMENTS
+) -> list[int]:
+    fold = above_the_fold(document, fold_elements)
+    kept = []
+    for index, rule in enumerate(rules):
+        if rule.raw is not None:
+            # @font-face, @keyframes and the like are cheap and may be needed at first paint.
+            if not rule.raw.startswith("@import"):
+                kept.append(index)
+            continue
+        if any(_match_complex(element, selector) for selector in rule.selectors for element in fold):
+            kept.append(index)
+    return kept
+
+
+# --------------------------------------------------------------------------- page transform
+
+
+@dataclass
+class PageStats:
+    stylesheet_bytes: int
+    critical_bytes: int
+    rules_total: int
+    rules_kept: int
+
+    @property
+    def saved_bytes(self) -> int:
+        return self.stylesheet_bytes - self.critical_bytes
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _async_stylesheet(indent: str, href: str, critical: str) -> str:
+    return (
+        f"{indent}<style>{critical}</style>\n"
+        f'{indent}<link rel="preload" href="{href}" as="style" onload="this.onload=null;this.rel=\'stylesheet\'" />\n'
+        f'{indent}<noscript><link rel="stylesheet" href="{href}" /></noscript>'
+    )
+
+
+class CriticalCss:
+    """Page transform inlining the above-the-fold subset of each local stylesheet."""
+
+    def __init__(
+        self, root: Path = SITE_ROOT, cache_path: Path = DEFAULT_CACHE, fold_elements: int = DEFAULT_FOLD_ELEMENTS
+    ):
+        self.root = root
+        self.cache_path = cache_path
+        self.fold_elements = fold_elements
+        self._sheets: dict[str, tuple[str, list[CssRule]]] = {}
+        try:
+            cache = json.loads(cache_path.read_text(encoding="utf-8"))
+        except (FileNotFoundError, ValueError):
+            cache = {}
+        self.cache: dict[str, dict] = cache.get("pages", {}) if cache.get("version") == CRITICAL_VERSION else {}
+        self.stats: dict[str, PageStats] = {}
+        self.matched = 0
+        sheets = sorted(path.name for path in root.glob("*.css"))
+        payload = "".join(f"{name}\0{_sha256(self._sheet(name)[0])}\n" for name in sheets)
+        self.key = _sha256(f"{CRITICAL_VERSION}\n{fold_elements}\n{payload}")
+
+    def _sheet(self, href: str) -> tuple[str, list[CssRule]]:
+        if href not in self._sheets:
+            text = (self.root / href).read_text(encoding="utf-8")
+            self._sheets[href] = (text, parse_stylesheet(text))
+        return self._sheets[href]
+
+    def critical_for(self, html: str, page_name: str, href: str) -> tuple[str, PageStats]:
+        text, rules = self._sheet(href)
+        cache_key = _sha256(f"{CRITICAL_VERSION}\n{self.fold_elements}\n{_sha256(text)}\n{html}")
+        entry = self.cache.get(f"{page_name}|{href}")
+        if entry and entry["key"] == cache_key:
+            indices = entry["rules"]
+        else:
+            indices = critical_rule_indices(rules, parse_document(html), self.fold_elements)
+            self.cache[f"{page_name}|{href}"] = {"key": cache_key, "rules": indices}
+            self.matched += 1
+        critical = serialize_rules([rules[index] for index in indices])
+        stats = PageStats(len(text.encode("utf-8")), len(critical.encode("utf-8")), len(rules), len(indices))
+        return critical, stats
+
+    def __call__(self, html: str, page_name: str) -> str:
+        def replace(match: re.Match[str]) -> str:
+            href = match.group("href")
+            if "://" in href or href.startswith("/") or not (self.root / href).is_file():
+                return match.group(0)
+            critical, stats = self.critical_for(html, page_name, href)
+            self.stats[page_name] = stats
+            return _async_stylesheet(match.group("indent"), href, critical)
+
+        return STYLESHEET_LINK_RE.sub(replace, html)
+
+    def save(self) -> None:
+        pages = {Path(rel).name for rel in discover_pages(self.root)}
+        live = {key: value for key, value in self.cache.items() if key.split("|", 1)[0] in pages}
+        _write_atomic(
+            self.cache_path,
+            (json.dumps({"version": CRITICAL_VERSION, "pages": live}, indent=1, sort_keys=True) + "\n").encode(),
+        )
+
+
+def format_report(stats: dict[str, PageStats]) -> str:
+    lines = [f"{'page':<20} {'rules':>9} {'blocking CSS':>13} {'inlined':>9} {'saved':>9}"]
+    for page, item in sorted(stats.items()):
+        lines.append(
+            f"{page:<20} {item.rules_kept:>4}/{item.rules_total:<4} {item.stylesheet_bytes:>11} B "
+            f"{item.critical_bytes:>7} B {item.saved_bytes:>7} B"
+        )
+    return "\n".join(lines)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Report the critical CSS inlined in each page.")
+    parser.add_argument(
+        "--cache",
+        type=Path,
+        default=DEFAULT_CACHE,
+        help="Selector match cache (default: .build-cache/critical.json).",
+    )
+    parser.add_argument(
+        "--fold-elements",
+        type=int,
+        default=DEFAULT_FOLD_ELEMENTS,
+        help=f"Add sections of <main> to the fold until they hold this many elements (default: {DEFAULT_FOLD_ELEMENTS}).",
+    )
+    return parser
+
+
+def main(argv: list[str]) -> int:
+    args = build_parser().parse_args(argv)
+    transform = CriticalCss(SITE_ROOT, args.cache, args.fold_elements)
+    for page_rel in discover_pages(SITE_ROOT):
+        render_page(SITE_ROOT, page_rel, [transform])
+    transform.save()
+    print(format_report(transform.stats))
+    print(f"{transform.matched} page(s) matched, {len(transform.stats) - transform.matched} from cache")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+Delta deployment of the built site to Hostinger over FTPS.
+
+The deployer hashes every file of the local folder (SHA-256), downloads the
+manifest left on the server by the previous deployment and uploads only the
+files whose hash changed, over a pool of concurrent FTPS sessions. Each file
+is written under a temporary name then renamed into place, so visitors never
+see a half-written file. Assets go first and HTML/PHP last, so a page never
+references an asset that is not online yet. Files from the previous
+manifest that no longer exist locally are deleted at the end.
+
+If the manifest and the server drift apart (manual edits, interrupted run),
+a size listing of the server (MLSD) re-uploads only the affected files
+rather than the whole site. When there is no manifest yet, the file list of
+the former FTP-Deploy-Action state file stands in for it, so the first
+run also deletes what that action pushed and the site no longer has. The manifest and the upload temporaries are
+dotfiles in the web root; the .htaccess generated by build_assets.py
+refuses to serve dotfiles.
+
+Example:
+    $ python build_site.py --images --critical-css --assets
+    $ python deploy_hostinger.py --local-dir dist --workers 4 --dry-run
+
+    # Local FTP stand-in (pip install pyftpdlib):
+    $ python -m pyftpdlib -p 2121 -w -d /tmp/hostinger -u cln -P secret &
+    $ python deploy_hostinger.py --protocol ftp --host 127.0.0.1 --port 2121 \\
+        --user cln --password secret --server-dir /
+
+Environment variables provide the defaults, with the same names as the
+GitHub secrets: HOSTINGER_FTP_HOST, HOSTINGER_FTP_USER,
+HOSTINGER_FTP_PASSWORD, HOSTINGER_FTP_DIR (plus HOSTINGER_FTP_PORT).
+"""
+
+from __future__ import annotations
+
+import argparse
+import ftplib
+import hashlib
+import io
+import json
+import os
+import posixpath
+import re
+import ssl
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Optional
+
+
+ENV_PREFIX = "HOSTINGER_"
+MANIFEST_NAME = ".cln-deploy-manifest.json"
+MANIFEST_VERSION = 1
+# State file of the former FTP-Deploy-Action step; read once to seed the first manifest.
+LEGACY_STATE_NAME = "hostinger-deploy-state.json"
+# Same exclusions as the former FTP-Deploy-Action step.
+DEFAULT_EXCLUDES = (
+    "**/.git*",
+    "**/.github/workflows/**",
+    "**/.env",
+    "**/*.ps1",
+    "**/*.py",
+    "PRESENTATION_PPT/**",
+)
+# Uploaded last so pages only go live once everything they reference is online.
+ENTRY_POINT_SUFFIXES = (".html", ".php", ".htaccess")
+UPLOAD_ATTEMPTS = 3
+RENAME_ATTEMPTS = 3
+
+
+def env_default(name: str, fallback: Optional[str] = None) -> Optional[str]:
+    """Read a default value from the environment."""
+    return os.getenv(f"{ENV_PREFIX}{name}") or fallback
+
+
+@dataclass
+class DeployConfig:
+    host: str
+    port: int
+    user: str
+    password: str
+    protocol: str
+    server_dir: str
+    local_dir: Path
+    workers: int
+    excludes: tuple[str, ...]
+    dry_run: bool
+    force: bool
+    timeout: int
+    verbose: bool
+
+
+@dataclass
+class DeployPlan:
+    uploads: list[str] = field(default_factory=list)
+    deletes: list[str] = field(default_factory=list)
+    unchanged: int = 0
+    upload_bytes: int = 0
+
+
+# --------------------------------------------------------------------------- local side
+
+
+def _glob_to_regex(pattern: str) -> re.Pattern[str]:
+    """Translate a deploy glob (**, *, ?) into a regex matched against the relative path."""
+    out = []
+    index = 0
+    while index < len(pattern):
+        if pattern.startswith("**/", index):
+            out.append("(?:.*/)?")
+            index += 3
+        elif pattern.startswith("**", index):
+            out.append(".*")
+            index += 2
+        elif pattern[index] == "*":
+            out.append("[^/]*")
+            index += 1
+        elif pattern[index] == "?":
+            out.append("[^/]")
+            index += 1
+        else:
+            out.append(re.escape(pattern[index]))
+            index += 1
+    return re.compile("".join(out) + r"\Z")
+
+
+def compile_excludes(patterns: tuple[str, ...]) -> list[re.Pattern[str]]:
+    return [_glob_to_regex(pattern) for pattern in patterns]
+
+
+def is_excluded(rel: str, excludes: list[re.Pattern[str]]) -> bool:
+    # A pattern matching a parent folder ("**/.git*" on ".git/config") excludes its content.
+    parts = rel.split("/")
+    prefixes = ["/".join(parts[: depth + 1]) for depth in range(len(parts))]
+    return any(regex.match(prefix) for regex in excludes for prefix in prefixes)
+
+
+def build_local_manifest(local_dir: Path, excludes: list[re.Pattern[str]]) -> dict[str, dict]:
+    manifest: dict[str, dict] = {}
+    for path in sorted(local_dir.rglob("*")):
+        if not path.is_file():
+            continue
+        rel = path.relative_to(local_dir).as_posix()
+        if rel == MANIFEST_NAME or is_excluded(rel, excludes):
+            continue
+        data = path.read_bytes()
+        manifest[rel] = {"sha256": hashlib.sha256(data).hexdigest(), "size": len(data)}
+    return manifest
+
+
+def is_entry_point(rel: str) -> bool:
+    return rel.removesuffix(".gz").endswith(ENTRY_POINT_SUFFIXES)
+
+
+def plan_deploy(
+    local: dict[str, dict],
+    remote: dict[str, dict],
+    remote_sizes: Optional[dict[str, int]] = None,
+    *,
+    force: bool = False,
+) -> DeployPlan:
+    plan = DeployPlan()
+    for rel, entry in local.items():
+        previous = remote.get(rel)
+        drifted = remote_sizes is not None and remote_sizes.get(rel) != entry["size"]
+        if force or not previous or previous["sha256"] != entry["sha256"] or drifted:
+            plan.uploads.append(rel)
+            plan.upload_bytes += entry["size"]
+        else:
+            plan.unchanged += 1
+    plan.uploads.sort(key=lambda rel: (is_entry_point(rel), rel))
+    plan.deletes = sorted(rel for rel in remote if rel not in local)
+    return plan
+
+
+# --------------------------------------------------------------------------- remote side
+
+
+class SessionPool:
+    """One FTP(S) connection per worker thread, opened lazily and closed together."""
+
+    def __init__(self, cfg: DeployConfig):
+        self.cfg = cfg
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._sessions: list[ftplib.FTP] = []
+
+    def connect(self) -> ftplib.FTP:
+        cfg = self.cfg
+        if cfg.protocol == "ftps":
+            ftp: ftplib.FTP = ftplib.FTP_TLS(context=ssl.create_default_context(), timeout=cfg.timeout)
+        else:
+            ftp = ftplib.FTP(timeout=cfg.timeout)
+        ftp.connect(cfg.host, cfg.port)
+        ftp.login(cfg.user, cfg.password)
+        if isinstance(ftp, ftplib.FTP_TLS):
+            ftp.prot_p()
+        ftp.voidcmd("TYPE I")
+        with self._lock:
+            self._sessions.append(ftp)
+        return ftp
+
+    def session(self) -> ftplib.FTP:
+        ftp = getattr(self._local, "ftp", None)
+        if ftp is None:
+            ftp = self._local.ftp = self.connect()
+        return ftp
+
+    def revive(self, ftp: ftplib.FTP) -> ftplib.FTP:
+        """Return ``ftp`` if it still answers, else a fresh connection.
+
+        The control connection sits idle while the workers upload, and the
+        server drops idle sessions (about 300 s on Hostinger).
+        """
+        try:
+            ftp.voidcmd("NOOP")
+            return ftp
+        except ftplib.all_errors:
+            with self._lock:
+                if ftp in self._sessions:
+                    self._sessions.remove(ftp)
+            ftp.close()
+        return self.connect()
+
+    def discard(self) -> None:
+        ftp = getattr(self._local, "ftp", None)
+        self._local.ftp = None
+        if ftp is not None:
+            with self._lock:
+                if ftp in self._sessions:
+                    self._sessions.remove(ftp)
+            _close_quietly(ftp)
+
+    def close(self) -> None:
+        with self._lock:
+            sessions, self._sessions = self._sessions, []
+        for ftp in sessions:
+            _close_quietly(ftp)
+
+    def __enter__(self) -> "SessionPool":
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+
+def _close_quietly(ftp: ftplib.FTP) -> None:
+    try:
+        ftp.quit()
+    except ftplib.all_errors:
+        ftp.close()
+
+
+def _remote_path(cfg: DeployConfig, rel: str) -> str:
+    return posixpath.join(cfg.server_dir, rel)
+
+
+def _fetch_json(ftp: ftplib.FTP, cfg: DeployConfig, rel: str) -> dict:
+    buffer = io.BytesIO()
+    try:
+        ftp.retrbinary(f"RETR {_remote_path(cfg, rel)}", buffer.write)
+    except ftplib.error_perm:
+        return {}
+    try:
+        document = json.loads(buffer.getvalue().decode("utf-8"))
+    except ValueError:
+        return {}
+    return document if isinstance(document, dict) else {}
+
+
+def fetch_remote_manifest(ftp: ftplib.FTP, cfg: DeployConfig) -> dict[str, dict]:
+    manifest = _fetch_json(ftp, cfg, MANIFEST_NAME)
+    if manifest.get("version") != MANIFEST_VERSION:
+        return {}
+    return manifest.get("files", {})
+
+
+def fetch_legacy_state(ftp: ftplib.FTP, cfg: DeployConfig) -> dict[str, dict]:
+    """Files recorded by FTP-Deploy-Action, as manifest entries (the state file itself included).
+
+    Its "data" list holds {"type": "file", "name": "img/a.jpg", "size": ..., "hash": <sha256>};
+    an entry without a usable hash is simply uploaded again.
+    """
+    state = _fetch_json(ftp, cfg, LEGACY_STATE_NAME)
+    if not state:
+        return {}
+    files = {LEGACY_STATE_NAME: {"sha256": "", "size": -1}}
+    for item in state.get("data", []):
+        if not isinstance(item, dict) or item.get("type") != "file" or not item.get("name"):
+            continue
+        rel = posixpath.normpath(str(item["name"])).lstrip("/")
+        if rel.startswith("../") or rel == MANIFEST_NAME:
+            continue
+        files[rel] = {"sha256": str(item.get("hash") or ""), "size": int(item.get("size") or -1)}
+    return files
+
+
+def list_remote_sizes(ftp: ftplib.FTP, cfg: DeployConfig, folders: set[str]) -> Optional[dict[str, int]]:
+    """Sizes of the remote files in the given folders, or None when MLSD is unsupported."""
+    sizes: dict[str, int] = {}
+    for folder in sorted(folders):
+        try:
+            entries = list(ftp.mlsd(_remote_path(cfg, folder), facts=["type", "size"]))
+        except ftplib.error_perm as exc:
+            if str(exc).startswith("550"):
+                continue  # folder does not exist yet
+            return None
+        for name, facts in entries:
+            if facts.get("type") == "file" and "size" in facts:
+                sizes[posixpath.join(folder, name) if folder else name] = int(facts["size"])
+    return sizes
+
+
+def ensure_remote_dirs(ftp: ftplib.FTP, cfg: DeployConfig, rels: list[str]) -> None:
+    folders = sorted({posixpath.dirname(rel) for rel in rels if posixpath.dirname(rel)})
+    created: set[str] = set()
+    for folder in folders:
+        parts = folder.split("/")
+        for depth in range(1, len(parts) + 1):
+            current = "/".join(parts[:depth])
+            if current in created:
+                continue
+            try:
+                ftp.mkd(_remote_path(cfg, current))
+            except ftplib.error_perm:
+                pass  # already exists
+            created.add(current)
+
+
+def _store_atomic(ftp: ftplib.FTP, target: str, data: bytes) -> None:
+    """Upload under a temporary name, then rename it over ``target``.
+
+    Servers that refuse to rename over an existing file get a delete then a
+    rename instead: between the two, ``target`` does not exist and requests
+    for it get a 404. The rename is retried so that window stays short
+    rather than leaving the file missing until the next deployment.
+    """
+    folder, name = posixpath.split(target)
+    temporary = posixpath.join(folder, f".{name}.{uuid.uuid4().hex[:8]}.part")
+    ftp.storbinary(f"STOR {temporary}", io.BytesIO(data))
+    try:
+        ftp.rename(temporary, target)
+        return
+    except ftplib.error_perm:
+        pass
+    try:
+        ftp.delete(target)
+    except ftplib.error_perm:
+        ftp.delete(temporary)
+        raise
+    for attempt in range(1, RENAME_ATTEMPTS + 1):
+        try:
+            ftp.rename(temporary, target)
+            return
+        except (ftplib.error_perm, ftplib.error_temp):
+            if attempt == RENAME_ATTEMPTS:
+                ftp.delete(temporary)
+                raise
+            time.sleep(0.2 * attempt)
+
+
+def upload_file(pool: SessionPool, cfg: DeployConfig, rel: str) -> int:
+    data = (cfg.local_dir / rel).read_bytes()
+    for attempt in range(1, UPLOAD_ATTEMPTS + 1):
+        try:
+            _store_atomic(pool.session(), _remote_path(cfg, rel), data)
+            return len(data)
+        except (ftplib.error_temp, ftplib.error_reply, OSError, EOFError):
+            pool.discard()
+            if attempt == UPLOAD_ATTEMPTS:
+                raise
+            time.sleep(attempt)
+    return 0
+
+
+def store_remote_manifest(ftp: ftplib.FTP, cfg: DeployConfig, files: dict[str, dict]) -> None:
+    payload = json.dumps({"version": MANIFEST_VERSION, "files": files}, indent=1, sort_keys=True)
+    _store_atomic(ftp, _remote_path(cfg, MANIFEST_NAME), payload.encode("utf-8"))
+
+
+def deploy(cfg: DeployConfig) -> int:
+    start = time.perf_counter()
+    excludes = compile_excludes(cfg.excludes)
+    local = build_local_manifest(cfg.local_dir, excludes)
+    print(f"Local: {len(local)} file(s) hashed in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    with SessionPool(cfg) as pool:
+        control = pool.connect()
+        remote = {} if cfg.force else fetch_remote_manifest(control, cfg)
+        if not remote and not cfg.force:
+            remote = fetch_legacy_state(control, cfg)
+        folders = {posixpath.dirname(rel) for rel in remote}
+        remote_sizes = list_remote_sizes(control, cfg, folders) if remote else None
+        plan = plan_deploy(local, remote, remote_sizes, force=cfg.force)
+        print(
+            f"Plan: {len(plan.uploads)} upload(s) ({plan.upload_bytes} bytes), "
+            f"{len(plan.deletes)} deletion(s), {plan.unchanged} unchanged"
+        )
+        if cfg.verbose or cfg.dry_run:
+            for rel in plan.uploads:
+                print(f"  upload {rel}")
+            for rel in plan.deletes:
+                print(f"  delete {rel}")
+        if cfg.dry_run:
+            return 0
+
+        ensure_remote_dirs(control, cfg, plan.uploads)
+        # What the server holds, updated as uploads succeed so a partial run can resume.
+        published = dict(remote)
+        failures: list[str] = []
+        assets = [rel for rel in plan.uploads if not is_entry_point(rel)]
+        entry_points = [rel for rel in plan.uploads if is_entry_point(rel)]
+
+        with ThreadPoolExecutor(max_workers=max(1, cfg.workers)) as executor:
+            for batch in (assets, entry_points):
+                futures = {executor.submit(upload_file, pool, cfg, rel): rel for rel in batch}
+                for future in as_completed(futures):
+                    rel = futures[future]
+                    try:
+                        future.result()
+                    except (ftplib.all_errors, OSError) as exc:
+                        failures.append(rel)
+                        print(f"[ERROR] upload failed for {rel}: {exc}", file=sys.stderr)
+                        continue
+                    published[rel] = local[rel]
+                    if cfg.verbose:
+                        print(f"  uploaded {rel}")
+                if failures:
+                    break
+
+        control = pool.revive(control)
+        if not failures:
+            for rel in plan.deletes:
+                try:
+                    control.delete(_remote_path(cfg, rel))
+                except ftplib.error_perm as exc:
+                    if not str(exc).startswith("550"):
+                        raise
+                published.pop(rel, None)
+
+        store_remote_manifest(control, cfg, published)
+
+    elapsed = time.perf_counter() - start
+    if failures:
+        print(f"[ERROR] {len(failures)} file(s) failed; stale files kept. Re-run to resume.", file=sys.stderr)
+        return 1
+    print(f"Deployed {len(plan.uploads)} file(s), removed {len(plan.deletes)} in {elapsed:.1f}s")
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Upload the changed files of the built site to Hostinger.")
+    parser.add_argument("--host", default=env_default("FTP_HOST"), help="FTP(S) server hostname.")
+    parser.add_argument("--port", type=int, default=int(env_default("FTP_PORT", "21")), help="Server port.")
+    parser.add_argument("--user", default=env_default("FTP_USER"), help="FTP username.")
+    parser.add_argument("--password", default=env_default("FTP_PASSWORD"), help="FTP password.")
+    parser.add_argument(
+        "--server-dir",
+        default=env_default("FTP_DIR", "/public_html/"),
+        help="Remote folder (default: /public_html/).",
+    )
+    parser.add_argument(
+        "--protocol",
+        choices=("ftps", "ftp"),
+        default="ftps",
+        help="Use plain ftp only against a local stand-in (default: ftps).",
+    )
+    parser.add_argument("--local-dir", type=Path, default=Path("dist"), help="Folder to publish (default: dist).")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent upload sessions (default: 4).")
+    parser.add_argument(
+        "--exclude",
+        action="append",
+        default=[],
+        help="Additional glob to exclude (repeatable); the workflow exclusions always apply.",
+    )
+    parser.add_argument("--timeout", type=int, default=60, help="Socket timeout in seconds (default: 60).")
+    parser.add_argument("--dry-run", action="store_true", help="Show the plan without changing the server.")
+    parser.add_argument("--force", action="store_true", help="Ignore the remote manifest and upload everything.")
+    parser.add_argument("--verbose", action="store_true", help="List every file uploaded.")
+    return parser
+
+
+def validate_args(args: argparse.Namespace) -> DeployConfig:
+    if not args.host:
+        raise SystemExit("Missing --host (or HOSTINGER_FTP_HOST).")
+    if not args.user:
+        raise SystemExit("Missing --user (or HOSTINGER_FTP_USER).")
+    if not args.password:
+        raise SystemExit("Missing --password (or HOSTINGER_FTP_PASSWORD).")
+    if not args.local_dir.is_dir():
+        raise SystemExit(f"Local folder not found: {args.local_dir} (run build_site.py first).")
+
+    return DeployConfig(
+        host=args.host,
+        port=args.port,
+        user=args.user,
+        password=args.password,
+        protocol=args.protocol,
+        server_dir=args.server_dir.rstrip("/") or "/",
+        local_dir=args.local_dir,
+        workers=max(1, args.workers),
+        excludes=DEFAULT_EXCLUDES + tuple(args.exclude),
+        dry_run=args.dry_run,
+        force=args.force,
+        timeout=args.timeout,
+        verbose=args.verbose,
+    )
+
+
+def main(argv: list[str]) -> int:
+    cfg = validate_args(build_parser().parse_args(argv))
+    try:
+        return deploy(cfg)
+    except ftplib.all_errors as exc:
+        print(f"[ERROR] FTP deployment failed: {exc}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    raise SystemExit(main(sys.argv[1:]))